@@ -20,6 +20,7 @@ from os import path
 import sys
 sys.path.append(path.dirname(path.realpath(__file__)))
 
+from asyncio import gather as _gather
 from functools import partial as _partial
 
 try:
@@ -33,12 +34,23 @@ except ImportError:
 from .session import SESSIONS
 from .pgoapi import PGoApi
 from .rpc_api import RpcApi
+from .bundle import RequestBundle
+from .inventory import Inventory
 from .hash_server import HashServer
+from .hash_backend import CallableHashBackend, HashBackend
+from .hash_router import HashRouter
+from .retry import RetryPolicy
+from .proxy_pool import ProxyPool
+from .resolver import DNS_CACHE, DnsCache
+from .tls import SSL_CONTEXT, ResumingContext
+from .transport import Aiohttp2Transport, AiohttpTransport, HttpTransport, RpcTransport, Transport
 
 
 def close_sessions():
-    SESSIONS.close()
-    HashServer.close_session()
+    """Close all sessions; returns a future to await with aiohttp 3."""
+    closing = [x for x in (SESSIONS.close(), HashServer.close_session()) if x is not None]
+    if closing:
+        return _gather(*closing)
 
 
 def activate_hash_server(hash_token, conn_limit=300):
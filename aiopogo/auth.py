@@ -2,11 +2,14 @@ from logging import getLogger
 from time import time
 from asyncio import get_event_loop
 
+from .retry import RETRY_POLICY
 from .utilities import get_time_ms
 
 
 class Auth:
     loop = get_event_loop()
+    # retry budgets, backoff and circuit breakers of logins
+    retry_policy = RETRY_POLICY
 
     def __init__(self):
         self.log = getLogger(__name__)
@@ -7,7 +7,7 @@ from aiohttp import ClientRequest, ClientSession, ClientError, ClientHttpProxyEr
 from . import json_loads
 from .session import SESSIONS, ProxyClientRequest
 from .auth import Auth
-from .exceptions import ActivationRequiredException, AuthConnectionException, AuthException, AuthTimeoutException, InvalidCredentialsException, ProxyException, SocksError, UnexpectedAuthError
+from .exceptions import ActivationRequiredException, AuthCircuitOpenException, AuthConnectionException, AuthException, AuthTimeoutException, InvalidCredentialsException, ProxyException, SocksError, UnexpectedAuthError
 
 
 class AuthPtc(Auth):
@@ -36,11 +36,16 @@ class AuthPtc(Auth):
             raise InvalidCredentialsException(
                 "Username/password not correctly specified") from e
         self.log.info('PTC User Login for: %s', self._username)
+        await self.retry_policy.call('sso.pokemon.com', self._login,
+                                     exception=AuthCircuitOpenException)
 
+    async def _login(self):
+        # keeps the borrowed connector from being closed by an eviction
+        connector = SESSIONS.hold(self.proxy).connector
         try:
             now = time()
             async with ClientSession(
-                    connector=SESSIONS.get_connector(self.socks),
+                    connector=connector,
                     loop=self.loop,
                     headers=(('Host', 'sso.pokemon.com'),
                              ('Connection', 'keep-alive'),
@@ -112,6 +117,8 @@ class AuthPtc(Auth):
                 e.__class__.__name__)) from e
         except (AssertionError, TypeError, ValueError) as e:
             raise AuthException('Invalid initial JSON response.') from e
+        finally:
+            SESSIONS.release(self.proxy)
 
         if self._access_token:
             self.authenticated = True
@@ -0,0 +1,67 @@
+from asyncio import CancelledError, get_event_loop
+
+
+class RequestBatcher:
+    '''Coalesces calls from one account into shared request envelopes.
+
+    Sub-requests submitted within `window` seconds of the first pending
+    one are sent together in a single envelope, and so cost a single hash.
+    Each caller gets back only the returns of its own sub-requests.
+    '''
+    __slots__ = ('api', 'window', 'limit', 'loop', '_pending', '_size', '_handle')
+
+    def __init__(self, api, window=0.05, limit=20, loop=None):
+        self.api = api
+        self.window = window
+        self.limit = limit
+        self.loop = loop or get_event_loop()
+        self._pending = []
+        self._size = 0
+        self._handle = None
+
+    def submit(self, subrequests, subplatforms):
+        '''Queue sub-requests and return a future for their responses.'''
+        if self._pending and self._size + len(subrequests) > self.limit:
+            self.flush()
+        future = self.loop.create_future()
+        self._pending.append((list(subrequests), list(subplatforms), future))
+        self._size += len(subrequests)
+        if self._size >= self.limit:
+            self.flush()
+        elif self._handle is None:
+            self._handle = self.loop.call_later(self.window, self.flush)
+        return future
+
+    def flush(self):
+        '''Send everything that is pending now instead of waiting.'''
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self._pending:
+            batch, self._pending, self._size = self._pending, [], 0
+            self.loop.create_task(self._send(batch))
+
+    async def _send(self, batch):
+        subrequests = []
+        subplatforms = []
+        split = []
+        for requests, platforms, _ in batch:
+            subrequests.extend(requests)
+            subplatforms.extend(platforms)
+            split.append(len(requests))
+
+        try:
+            responses, timings = await self.api._call(
+                subrequests, subplatforms, split)
+        except CancelledError:
+            for *_, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for response, (*_, future) in zip(responses, batch):
+                if not future.done():
+                    future.set_result((response, timings))
@@ -0,0 +1,53 @@
+from keyword import iskeyword
+
+from google.protobuf.descriptor import FieldDescriptor
+
+from .registry import REQUESTS
+
+
+def _copy_message(field, value):
+    if isinstance(value, dict):
+        for k, v in value.items():
+            setattr(field, k, v)
+    else:
+        field.CopyFrom(value)
+
+
+def make_builder(message_class):
+    '''Generate a function that creates a message_class from keyword arguments.
+
+    Every field becomes a keyword-only argument that is assigned directly,
+    repeated fields are filled with a single extend() so arrays and other
+    buffers are passed through as they are. Returns None if a field name
+    can't be used as an argument.
+    '''
+    fields = message_class.DESCRIPTOR.fields
+    if any(iskeyword(field.name) for field in fields):
+        return None
+    lines = ['def build(*, {}):'.format(
+                 ', '.join('{}=None'.format(field.name) for field in fields)),
+             '    message = message_class()']
+    for field in fields:
+        if field.label == FieldDescriptor.LABEL_REPEATED:
+            statement = 'message.{0}.extend({0})'
+        elif field.type == FieldDescriptor.TYPE_MESSAGE:
+            statement = '_copy_message(message.{0}, {0})'
+        else:
+            statement = 'message.{0} = {0}'
+        lines.append('    if {} is not None:'.format(field.name))
+        lines.append('        ' + statement.format(field.name))
+    lines.append('    return message')
+
+    namespace = {'message_class': message_class, '_copy_message': _copy_message}
+    exec('\n'.join(lines), namespace)
+    build = namespace['build']
+    build.__name__ = build.__qualname__ = 'build_' + message_class.__name__
+    return build
+
+
+BUILDERS = {}
+for _name in ('GET_MAP_OBJECTS', 'ENCOUNTER', 'FORT_SEARCH', 'FORT_DETAILS',
+              'CATCH_POKEMON', 'GET_GYM_DETAILS'):
+    _type_id = REQUESTS.ids[_name]
+    BUILDERS[_type_id] = make_builder(REQUESTS[_type_id][0])
+del _name, _type_id
@@ -0,0 +1,82 @@
+from .registry import PLATFORM_REQUESTS, REQUESTS
+from .rpc_api import RpcApi
+
+
+class RequestBundle:
+    '''A fixed set of sub-requests that is resolved once and reused.
+
+    Entries are request names, optionally paired with constant arguments:
+
+        RequestBundle(
+            'GET_MAP_OBJECTS', 'CHECK_CHALLENGE', 'GET_HATCHED_EGGS',
+            ('GET_INVENTORY', {'last_timestamp_ms': 0}),
+            'CHECK_AWARDED_BADGES',
+            ('DOWNLOAD_SETTINGS', {'hash': '...'}),
+            'GET_BUDDY_WALKED')
+
+    Type ids are looked up and constant arguments are serialized here, so
+    executing the bundle only builds the messages whose arguments vary.
+    Those are passed per call as lowercase keyword arguments, e.g.
+    bundle.build(get_map_objects={'cell_id': cells, ...}); they are merged
+    over the constant arguments of that entry.
+    '''
+    __slots__ = ('_requests', '_platforms', '_constants', '_names')
+
+    def __init__(self, *entries):
+        requests = []
+        platforms = []
+        constants = {}
+        names = {}
+        for entry in entries:
+            if isinstance(entry, str):
+                name, arguments = entry, None
+            else:
+                name, arguments = entry
+            name = name.upper()
+            if name in REQUESTS.ids:
+                type_id = REQUESTS.ids[name]
+                registry, target = REQUESTS, requests
+            elif name in PLATFORM_REQUESTS.ids:
+                type_id = PLATFORM_REQUESTS.ids[name]
+                registry, target = PLATFORM_REQUESTS, platforms
+            else:
+                raise ValueError('{} not known.'.format(name))
+            if name.lower() in names:
+                raise ValueError('{} is already in the bundle.'.format(name))
+            names[name.lower()] = target is platforms, len(target)
+            if arguments:
+                constants[name.lower()] = arguments
+                message = RpcApi._create_message(arguments, registry[type_id][0]())
+                target.append((type_id, message.SerializeToString()))
+            else:
+                target.append(type_id)
+        self._requests = tuple(requests)
+        self._platforms = tuple(platforms)
+        self._constants = constants
+        self._names = names
+
+    def build(self, **arguments):
+        '''Return the sub-request and platform request lists for one call.'''
+        if not arguments:
+            return list(self._requests), list(self._platforms)
+        requests = list(self._requests)
+        platforms = list(self._platforms)
+        for name, kwargs in arguments.items():
+            try:
+                platform, index = self._names[name]
+            except KeyError:
+                raise ValueError('{} is not in the bundle.'.format(name))
+            target = platforms if platform else requests
+            constant = self._constants.get(name)
+            if constant:
+                kwargs = dict(constant, **kwargs)
+            entry = target[index]
+            target[index] = (entry if isinstance(entry, int) else entry[0], kwargs)
+        return requests, platforms
+
+    def __len__(self):
+        return len(self._requests) + len(self._platforms)
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__, ', '.join(name.upper() for name in self._names))
@@ -0,0 +1,108 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from .wire import scan_map_cells
+
+WILD_POKEMON_DTYPE = [
+    ('encounter_id', 'u8'),
+    ('spawn_point_id', 'S16'),
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('pokemon_id', 'u2'),
+    ('time_till_hidden_ms', 'i4'),
+    ('last_modified_timestamp_ms', 'i8'),
+    ('s2_cell_id', 'u8')]
+
+MAP_POKEMON_DTYPE = [
+    ('encounter_id', 'u8'),
+    ('spawn_point_id', 'S16'),
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('pokemon_id', 'u2'),
+    ('expiration_timestamp_ms', 'i8'),
+    ('s2_cell_id', 'u8')]
+
+NEARBY_POKEMON_DTYPE = [
+    ('encounter_id', 'u8'),
+    ('pokemon_id', 'u2'),
+    ('distance_in_meters', 'f4'),
+    ('fort_id', 'S40'),
+    ('s2_cell_id', 'u8')]
+
+FORT_DTYPE = [
+    ('id', 'S40'),
+    ('type', 'u1'),
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('enabled', '?'),
+    ('owned_by_team', 'u1'),
+    ('last_modified_timestamp_ms', 'i8'),
+    ('s2_cell_id', 'u8')]
+
+SPAWN_POINT_DTYPE = [
+    ('latitude', 'f8'),
+    ('longitude', 'f8'),
+    ('s2_cell_id', 'u8')]
+
+
+def map_objects_to_arrays(responses):
+    '''Convert one or many GetMapObjectsResponse messages, or their
+    serialized bytes, to NumPy structured arrays with fixed-width fields,
+    one per entity kind.
+
+    Returns a dict with 'wild_pokemon', 'map_pokemon', 'nearby_pokemon',
+    'forts' and 'spawn_points' keys, see the *_DTYPE lists for the
+    columns. Rows are collected as tuples and packed by NumPy in a single
+    call per kind; strings are stored as ASCII bytes. Serialized responses
+    (e.g. from LazyResponses.raw) are read with wire.scan_map_cells and
+    never decoded into messages, which is much faster. The arrays can be
+    handed to executemany() via .tolist() or written out with .tobytes().
+    '''
+    if np is None:
+        raise ImportError('Install numpy to use map_objects_to_arrays.')
+    if isinstance(responses, (bytes, bytearray, memoryview)) or hasattr(responses, 'map_cells'):
+        responses = (responses,)
+    wild = []
+    catchable = []
+    nearby = []
+    forts = []
+    spawns = []
+    for response in responses:
+        if isinstance(response, (bytes, bytearray, memoryview)):
+            kinds = scan_map_cells(response)
+            wild.extend(kinds['wild_pokemon'])
+            catchable.extend(kinds['map_pokemon'])
+            nearby.extend(kinds['nearby_pokemon'])
+            forts.extend(kinds['forts'])
+            spawns.extend(kinds['spawn_points'])
+            continue
+        for cell in response.map_cells:
+            cell_id = cell.s2_cell_id
+            wild.extend(
+                (p.encounter_id, p.spawn_point_id, p.latitude, p.longitude,
+                 p.pokemon_data.pokemon_id, p.time_till_hidden_ms,
+                 p.last_modified_timestamp_ms, cell_id)
+                for p in cell.wild_pokemons)
+            catchable.extend(
+                (p.encounter_id, p.spawn_point_id, p.latitude, p.longitude,
+                 p.pokemon_id, p.expiration_timestamp_ms, cell_id)
+                for p in cell.catchable_pokemons)
+            nearby.extend(
+                (p.encounter_id, p.pokemon_id, p.distance_in_meters, p.fort_id,
+                 cell_id)
+                for p in cell.nearby_pokemons)
+            forts.extend(
+                (f.id, f.type, f.latitude, f.longitude, f.enabled,
+                 f.owned_by_team, f.last_modified_timestamp_ms, cell_id)
+                for f in cell.forts)
+            spawns.extend(
+                (s.latitude, s.longitude, cell_id)
+                for s in cell.spawn_points)
+    return {
+        'wild_pokemon': np.array(wild, dtype=WILD_POKEMON_DTYPE),
+        'map_pokemon': np.array(catchable, dtype=MAP_POKEMON_DTYPE),
+        'nearby_pokemon': np.array(nearby, dtype=NEARBY_POKEMON_DTYPE),
+        'forts': np.array(forts, dtype=FORT_DTYPE),
+        'spawn_points': np.array(spawns, dtype=SPAWN_POINT_DTYPE)}
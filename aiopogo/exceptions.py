@@ -98,6 +98,15 @@ class HashingOfflineException(ServerBusyOrOfflineException, HashServerException)
 class HashingTimeoutException(HashingOfflineException, TimeoutException):
     """Raised when a request to the hashing server times out."""
 
+class CircuitOpenException(ServerBusyOrOfflineException):
+    """Raised when calls to a server are shed because it keeps failing"""
+
+class HashingCircuitOpenException(CircuitOpenException, HashingOfflineException):
+    """Raised when hashing requests are shed because the server keeps failing"""
+
+class AuthCircuitOpenException(CircuitOpenException, AuthConnectionException):
+    """Raised when logins are shed because the auth server keeps failing"""
+
 
 class PleaseInstallProtobufVersion3(AiopogoError):
     """Raised when Protobuf is unavailable or too old"""
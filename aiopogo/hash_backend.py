@@ -0,0 +1,80 @@
+from asyncio import gather, get_event_loop
+from time import monotonic
+
+from .hash_payload import request_bytes
+
+
+class HashBackend:
+    '''Computes the location and request hashes of a request envelope.
+
+    RpcApi awaits hash() of the backend set with PGoApi.set_hash_backend,
+    or of a HashServer if none was set. Subclasses override hash().
+    '''
+
+    async def hash(self, timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests):
+        '''Return (location_hash, location_auth_hash, request_hashes).
+
+        requests are the Request messages of the envelope, the hashes are
+        signed 32 and 64-bit ints as SignalLog expects them.
+        '''
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CallableHashBackend(HashBackend):
+    '''Hashes in-process with func, e.g. a binding to a native library.
+
+    func is called with the timestamp, latitude, longitude, accuracy,
+    serialized auth ticket, session data and a list of the serialized
+    requests and must return what HashBackend.hash returns. If executor
+    is given, func runs in it instead of on the event loop, which only
+    pays off if func releases the GIL or executor is a process pool.
+    '''
+    __slots__ = ('func', 'executor', 'loop')
+
+    def __init__(self, func, executor=None, loop=None):
+        self.func = func
+        self.executor = executor
+        self.loop = loop or get_event_loop()
+
+    async def hash(self, timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests):
+        requests = [request_bytes(x) for x in requests]
+        if self.executor is None:
+            return self.func(timestamp, latitude, longitude, accuracy,
+                             authticket, sessiondata, requests)
+        return await self.loop.run_in_executor(
+            self.executor, self.func, timestamp, latitude, longitude,
+            accuracy, authticket, sessiondata, requests)
+
+
+async def benchmark(backend, requests, calls=100, concurrency=10):
+    '''Measure the latency of backend.hash for the given Request messages.
+
+    Runs calls hashes with up to concurrency of them at once and returns
+    a dict with the throughput and the mean, median, 95th percentile and
+    maximum latency in seconds.
+    '''
+    latencies = []
+    args = (1500000000000, 40.7831, -73.9712, 10.0, b'\x00' * 96, b'\x00' * 16, requests)
+
+    async def worker(count):
+        for _ in range(count):
+            start = monotonic()
+            await backend.hash(*args)
+            latencies.append(monotonic() - start)
+
+    share, extra = divmod(calls, concurrency)
+    start = monotonic()
+    await gather(*(worker(share + (i < extra)) for i in range(concurrency)))
+    elapsed = monotonic() - start
+
+    latencies.sort()
+    count = len(latencies)
+    return {'calls': count,
+            'per_second': count / elapsed if elapsed else float('inf'),
+            'mean': sum(latencies) / count,
+            'median': latencies[count // 2],
+            'p95': latencies[min(count - 1, int(count * 0.95))],
+            'max': latencies[-1]}
@@ -0,0 +1,152 @@
+from asyncio import sleep
+from logging import getLogger
+from time import time
+
+
+class HashKey:
+    '''Quota of one hashing key as last reported by the hashing server.
+
+    remaining, maximum and period_end (epoch seconds) come from the
+    X-RateRequestsRemaining, X-MaxRequestCount and X-RatePeriodEnd headers
+    and are None until the first response. in_flight counts the requests
+    that were handed out but haven't been answered yet.
+    '''
+    __slots__ = ('token', 'remaining', 'maximum', 'period_end', 'expiration',
+                 'failures', 'in_flight', 'next_at')
+
+    def __init__(self, token):
+        self.token = token
+        self.remaining = None
+        self.maximum = None
+        self.period_end = None
+        self.expiration = None
+        self.failures = 0
+        self.in_flight = 0
+        self.next_at = 0.0
+
+    def headroom(self, now):
+        '''Requests that can still be sent in the current period.'''
+        if self.remaining is None:
+            # unknown keys are tried first, spread by their in-flight count
+            return (1 << 30) - self.in_flight
+        if self.period_end is not None and now >= self.period_end:
+            # the period ended since the last response, so the quota has
+            # been refilled even if no response said so yet
+            if self.maximum is not None:
+                self.remaining = self.maximum
+            self.period_end = None
+        return self.remaining - self.in_flight
+
+    def as_dict(self):
+        return {'remaining': self.remaining, 'maximum': self.maximum,
+                'period': self.period_end, 'expiration': self.expiration,
+                'failures': self.failures, 'in_flight': self.in_flight}
+
+    def __repr__(self):
+        return '<HashKey {:.10}... {}/{}>'.format(
+            self.token, self.remaining, self.maximum)
+
+
+class KeyScheduler:
+    '''Picks the hashing key with the most headroom for every request.
+
+    With pace enabled, requests on a key are spaced so that its remaining
+    quota lasts until the end of the period, allowing bursts of up to
+    burst requests. Only when every key is out of quota does acquire()
+    wait, and then only until the first period ends. keys maps tokens to
+    their HashKey for inspection.
+    '''
+    log = getLogger('hashing')
+
+    def __init__(self, tokens=(), reserve=3, pace=True, burst=5, loop=None):
+        self.keys = {}
+        self.reserve = reserve
+        self.pace = pace
+        self.burst = burst
+        self.loop = loop
+        for token in tokens:
+            self.add(token)
+
+    def add(self, token):
+        if token not in self.keys:
+            self.keys[token] = HashKey(token)
+
+    def remove(self, token):
+        self.keys.pop(token, None)
+
+    def _best(self, now):
+        best = None
+        best_headroom = None
+        for key in self.keys.values():
+            headroom = key.headroom(now)
+            if best is None or headroom > best_headroom:
+                best, best_headroom = key, headroom
+        return best, best_headroom
+
+    async def acquire(self):
+        '''Wait until a request may be sent and return the HashKey to use.
+
+        Every acquire() must be followed by a release() of the key.
+        '''
+        while True:
+            now = time()
+            key, headroom = self._best(now)
+            if key is None:
+                raise KeyError('No hashing keys.')
+            if headroom >= self.reserve:
+                break
+            # the reserve is only kept for periods with a known end
+            if key.period_end is None and headroom > 0:
+                break
+            ends = [k.period_end for k in self.keys.values()
+                    if k.period_end is not None]
+            # with no period end known, the responses in flight report one
+            resume = min(ends) if ends else now
+            self.log.info('Out of hashes, waiting for new period.')
+            await sleep(max(resume - now, 0) + 1)
+
+        key.in_flight += 1
+        if self.pace and key.period_end is not None and headroom > 0:
+            interval = max(key.period_end - now, 0) / headroom
+            start = max(key.next_at, now - interval * self.burst)
+            key.next_at = start + interval
+            if start > now:
+                try:
+                    await sleep(start - now)
+                except BaseException:
+                    key.in_flight -= 1
+                    raise
+        return key
+
+    def release(self, key, headers=None):
+        '''Return key after its request and update it from the headers of
+        the hashing server response, or count the request if there are none.'''
+        key.in_flight -= 1
+        if not headers:
+            if key.remaining:
+                key.remaining -= 1
+            return
+        try:
+            remaining = int(headers['X-RateRequestsRemaining'])
+            period_end = int(headers['X-RatePeriodEnd'])
+            maximum = int(headers['X-MaxRequestCount'])
+            expiration = int(headers['X-AuthTokenExpiration'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if key.period_end is not None and period_end == key.period_end and key.remaining is not None:
+            # responses can arrive out of order within a period
+            remaining = min(remaining, key.remaining)
+        key.remaining = remaining
+        key.period_end = period_end
+        key.maximum = maximum
+        key.expiration = expiration
+
+    def status(self):
+        '''Return a dict of the state of every key, keyed by token.'''
+        return {token: key.as_dict() for token, key in self.keys.items()}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, token):
+        return token in self.keys
@@ -0,0 +1,55 @@
+from base64 import b64encode
+from functools import lru_cache
+from struct import Struct
+
+_pack_double = Struct('<d').pack
+_unpack_int = Struct('<q').unpack
+
+
+def _varint(value):
+    value &= 0xffffffffffffffff
+    out = bytearray()
+    while value > 0x7f:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def request_bytes(request):
+    '''Serialize a Request message from its two fields, the same as
+    request.SerializeToString() without going through the protobuf
+    serializer; request_message is already serialized.'''
+    request_type = request.request_type
+    message = request.request_message
+    out = b'\x08' + _varint(request_type) if request_type else b''
+    if message:
+        out += b'\x12' + _varint(len(message)) + message
+    return out
+
+
+@lru_cache(maxsize=1024)
+def _ticket_fields(authticket, sessiondata):
+    # an auth ticket and session hash last for up to 30 minutes, so these
+    # are encoded once instead of for every hash
+    return (b',"AuthTicket":"' + b64encode(authticket) +
+            b'","SessionData":"' + b64encode(sessiondata) +
+            b'","Requests":[')
+
+
+def encode_payload(timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests):
+    '''Return the JSON body of a hashing server request as bytes.
+
+    It is assembled from pieces: the base64 auth ticket and session data
+    are cached per ticket, the sub-requests are wrapped around their
+    already serialized messages and base64 never needs JSON escaping.
+    '''
+    return b''.join((
+        b'{"Timestamp":%d,"Latitude64":%d,"Longitude64":%d,"Accuracy64":%d' % (
+            timestamp,
+            _unpack_int(_pack_double(latitude))[0],
+            _unpack_int(_pack_double(longitude))[0],
+            _unpack_int(_pack_double(accuracy))[0]),
+        _ticket_fields(bytes(authticket), bytes(sessiondata)),
+        b','.join(b'"' + b64encode(request_bytes(x)) + b'"' for x in requests),
+        b']}'))
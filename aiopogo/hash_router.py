@@ -0,0 +1,195 @@
+from asyncio import FIRST_COMPLETED, get_event_loop, wait
+from collections import deque
+from logging import getLogger
+from time import monotonic
+
+from .exceptions import HashServerException, HashingOfflineException
+from .hash_backend import HashBackend
+from .hash_keys import KeyScheduler
+from .hash_server import HashServer
+
+
+class EndpointStats:
+    '''Health of one backend as seen by HashRouter.'''
+    __slots__ = ('backend', 'latency', 'error_rate', 'failures', 'ejections',
+                 'ejected_until', 'probing', 'samples')
+
+    def __init__(self, backend, samples=100):
+        self.backend = backend
+        # exponentially weighted moving averages, None until the first call
+        self.latency = None
+        self.error_rate = 0.0
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.probing = False
+        self.samples = deque(maxlen=samples)
+
+    def percentile(self, fraction):
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    def as_dict(self):
+        return {'latency': self.latency, 'error_rate': self.error_rate,
+                'failures': self.failures, 'ejected_until': self.ejected_until}
+
+    def __repr__(self):
+        return '<EndpointStats {} {}>'.format(
+            getattr(self.backend, 'endpoint', self.backend), self.latency)
+
+
+class HashRouter(HashBackend):
+    '''Spreads hashing over several endpoints and fails over between them.
+
+    endpoints are HashBackends, or (url, tokens) pairs for HashServers
+    that each have their own keys. Every hash goes to the healthy
+    endpoint with the lowest latency average. If it hasn't answered
+    after the hedge_percentile of its recent latencies, the same hash is
+    also sent to the next best endpoint and the first answer wins. An
+    endpoint that fails eject_after times in a row is skipped for
+    eject_time seconds, doubled for every further ejection up to
+    max_eject_time, and then probed with a single request.
+    '''
+    log = getLogger('hashing')
+
+    def __init__(self, endpoints, alpha=0.2, hedge_percentile=0.95,
+                 min_hedge_delay=0.05, eject_after=3, eject_time=30.0,
+                 max_eject_time=300.0, loop=None):
+        self.endpoints = []
+        for endpoint in endpoints:
+            if not isinstance(endpoint, HashBackend):
+                url, tokens = endpoint
+                if isinstance(tokens, str):
+                    tokens = (tokens,)
+                endpoint = HashServer(url, KeyScheduler(tokens, loop=HashServer.loop))
+            self.endpoints.append(EndpointStats(endpoint))
+        if not self.endpoints:
+            raise ValueError('At least one endpoint is required.')
+        self.alpha = alpha
+        self.hedge_percentile = hedge_percentile
+        self.min_hedge_delay = min_hedge_delay
+        self.eject_after = eject_after
+        self.eject_time = eject_time
+        self.max_eject_time = max_eject_time
+        self.loop = loop or get_event_loop()
+
+    def _ranked(self, exclude=()):
+        '''Healthy endpoints, fastest first. Ejected endpoints whose time
+        is up are put first so one request probes them.'''
+        now = monotonic()
+        ranked = []
+        for stats in self.endpoints:
+            if stats in exclude:
+                continue
+            if stats.ejected_until > now:
+                continue
+            if stats.ejected_until:
+                if stats.probing:
+                    continue
+                ranked.append((-1.0, stats))
+            else:
+                ranked.append((stats.latency or 0.0, stats))
+        ranked.sort(key=lambda x: x[0])
+        return [stats for _, stats in ranked]
+
+    def _start(self, stats, args):
+        if stats.ejected_until:
+            stats.probing = True
+        return self.loop.create_task(self._timed(stats, args))
+
+    async def _timed(self, stats, args):
+        start = monotonic()
+        try:
+            result = await stats.backend.hash(*args)
+        except HashServerException:
+            self._failed(stats)
+            raise
+        finally:
+            # whatever the outcome, the probe is over
+            stats.probing = False
+        self._succeeded(stats, monotonic() - start)
+        return result
+
+    def _succeeded(self, stats, latency):
+        alpha = self.alpha
+        stats.latency = latency if stats.latency is None else (
+            alpha * latency + (1 - alpha) * stats.latency)
+        stats.error_rate *= 1 - alpha
+        stats.samples.append(latency)
+        stats.failures = 0
+        stats.ejections = 0
+        stats.ejected_until = 0.0
+        stats.probing = False
+
+    def _failed(self, stats):
+        stats.error_rate = self.alpha + (1 - self.alpha) * stats.error_rate
+        stats.failures += 1
+        stats.probing = False
+        if stats.ejected_until or stats.failures >= self.eject_after:
+            duration = min(self.eject_time * 2 ** stats.ejections, self.max_eject_time)
+            stats.ejections += 1
+            stats.ejected_until = monotonic() + duration
+            self.log.warning('Ejecting hash endpoint %s for %.1fs.',
+                             getattr(stats.backend, 'endpoint', stats.backend), duration)
+
+    def _hedge_delay(self, stats):
+        delay = stats.percentile(self.hedge_percentile)
+        if delay is None:
+            return None
+        return max(delay, self.min_hedge_delay)
+
+    async def hash(self, timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests):
+        args = (timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests)
+        tried = []
+        running = {}
+        hedge = True
+        error = None
+        try:
+            while True:
+                if not running:
+                    candidates = self._ranked(tried)
+                    if not candidates:
+                        break
+                    tried.append(candidates[0])
+                    running[self._start(candidates[0], args)] = candidates[0]
+
+                timeout = None
+                if hedge and len(running) == 1:
+                    # hedge once the only request is slower than usual
+                    timeout = self._hedge_delay(next(iter(running.values())))
+                done, _ = await wait(running, timeout=timeout,
+                                     return_when=FIRST_COMPLETED)
+                if not done:
+                    candidates = self._ranked(tried)
+                    if candidates:
+                        tried.append(candidates[0])
+                        running[self._start(candidates[0], args)] = candidates[0]
+                    hedge = False
+                    continue
+                for task in done:
+                    del running[task]
+                    try:
+                        return task.result()
+                    except HashServerException as e:
+                        error = e
+        finally:
+            for task in running:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # retrieve it so it isn't logged as never retrieved
+                    task.exception()
+        if error is not None:
+            raise error
+        raise HashingOfflineException('All hash endpoints are ejected.')
+
+    def status(self):
+        '''Return the health of every endpoint, keyed by its URL.'''
+        return {getattr(stats.backend, 'endpoint', repr(stats.backend)): stats.as_dict()
+                for stats in self.endpoints}
+
+    def close(self):
+        for stats in self.endpoints:
+            stats.backend.close()
@@ -1,126 +1,48 @@
 from ctypes import c_int32, c_int64
-from base64 import b64encode
-from asyncio import get_event_loop, TimeoutError, CancelledError, sleep
-from itertools import cycle
-from time import time
+from asyncio import get_event_loop, TimeoutError, CancelledError
 from logging import getLogger
 
-from aiohttp import ClientSession, ClientError, ClientResponseError, ServerConnectionError, ServerTimeoutError
+from . import json_loads
+from .hash_backend import HashBackend
+from .hash_keys import KeyScheduler
+from .hash_payload import encode_payload
+from .retry import RETRY_POLICY
+from .transport import DisconnectedError, HttpTransport, TransportError
+from .exceptions import BadHashRequestException, ExpiredHashKeyException, HashingCircuitOpenException, HashingOfflineException, HashingQuotaExceededException, HashingTimeoutException, MalformedHashResponseException, NoHashKeyException, TempHashingBanException, UnexpectedHashResponseException
 
-from . import json_dumps, json_loads
-from .connector import TimedConnector
-from .exceptions import BadHashRequestException, ExpiredHashKeyException, HashingOfflineException, HashingTimeoutException, MalformedHashResponseException, NoHashKeyException, TempHashingBanException, UnexpectedHashResponseException
-from .utilities import f2i
 
+class HashServer(HashBackend):
+    """Hashes with the Bossland hashing server or a compatible one.
 
-class HashServer:
-    _session = None
-    multi = False
+    Instances use the shared transport and keys, unless a self-hosted
+    server is set up with its own endpoint URL (which includes the API
+    version), KeyScheduler and optionally Transport, e.g.
+    HashServer('http://127.0.0.1:8000/api/v159_1/hash', KeyScheduler(['key'])).
+    """
+    transport = None
     loop = get_event_loop()
+    endpoint = 'http://pokehash.buddyauth.com/api/v159_1/hash'
+    keys = KeyScheduler(loop=loop)
+    retry_policy = RETRY_POLICY
     status = {}
     log = getLogger('hashing')
 
-    def __init__(self):
-        try:
-            self.instance_token = self.auth_token
-        except AttributeError:
-            NoHashKeyException(
+    def __init__(self, endpoint=None, keys=None, transport=None):
+        if endpoint is not None:
+            self.endpoint = endpoint
+        if keys is not None:
+            self.keys = keys
+        if transport is not None:
+            self.transport = transport
+        if not self.keys:
+            raise NoHashKeyException(
                 'You must provide a hash key before making a request.')
 
     async def hash(self, timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests):
-        status = self.key_status
-        iteration = 0
-        try:
-            while status['remaining'] < 3 and time() < status['refresh']:
-                if self.multi and iteration < self.multi:
-                    self.instance_token = self.auth_token
-                    status = self.key_status
-                    iteration += 1
-                else:
-                    self.log.info('Out of hashes, waiting for new period.')
-                    await sleep(status['refresh'] - time() + 1, loop=self.loop)
-                    break
-        except KeyError:
-            pass
-        headers = {'X-AuthToken': self.instance_token}
-
-        payload = {
-            'Timestamp': timestamp,
-            'Latitude64': f2i(latitude),
-            'Longitude64': f2i(longitude),
-            'Accuracy64': f2i(accuracy),
-            'AuthTicket': b64encode(authticket),
-            'SessionData': b64encode(sessiondata),
-            'Requests': [b64encode(x.SerializeToString()) for x in requests]
-        }
-
-        # request hashes from hashing server
-        for attempt in range(3):
-            try:
-                async with self._session.post("http://pokehash.buddyauth.com/api/v159_1/hash", headers=headers, json=payload) as resp:
-                    if resp.status == 400:
-                        status['failures'] += 1
-
-                        if status['failures'] < 10:
-                            if attempt < 2:
-                                await sleep(1.0)
-                                continue
-                            raise BadHashRequestException('400 was returned from the hashing server.')
-
-                        if self.multi:
-                            self.log.warning(
-                                '{:.10}... expired, removing from rotation.'.format(
-                                    self.instance_token))
-                            self.remove_token(self.instance_token)
-                            self.instance_token = self.auth_token
-                            if attempt < 2:
-                                headers = {'X-AuthToken': self.instance_token}
-                                continue
-                            return await self.hash(timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests)
-                        raise ExpiredHashKeyException("{:.10}... appears to have expired.".format(self.instance_token))
-
-                    resp.raise_for_status()
-                    status['failures'] = 0
-
-                    response = await resp.json(encoding='ascii', loads=json_loads)
-                    headers = resp.headers
-                    break
-            except ClientResponseError as e:
-                if e.code == 403:
-                    raise TempHashingBanException('Your IP was temporarily banned for sending too many requests with invalid keys')
-                elif e.code == 429:
-                    status['remaining'] = 0
-                    self.instance_token = self.auth_token
-                    return await self.hash(timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests)
-                elif e.code >= 500 or e.code == 404:
-                    raise HashingOfflineException(
-                        'Hashing server error {}: {}'.format(
-                            e.code, e.message))
-                else:
-                    raise UnexpectedHashResponseException('Unexpected hash code {}: {}'.format(e.code, e.message))
-            except ValueError as e:
-                raise MalformedHashResponseException('Unable to parse JSON from hash server.') from e
-            except (TimeoutError, ServerConnectionError, ServerTimeoutError) as e:
-                if attempt < 2:
-                    self.log.info('Hashing request timed out.')
-                    await sleep(1.5)
-                else:
-                    raise HashingTimeoutException('Hashing request timed out.') from e
-            except ClientError as e:
-                error = '{} during hashing. {}'.format(e.__class__.__name__, e)
-                if attempt < 2:
-                    self.log.info(error)
-                else:
-                    raise HashingOfflineException(error) from e
-
-        try:
-            status['remaining'] = int(headers['X-RateRequestsRemaining'])
-            status['period'] = int(headers['X-RatePeriodEnd'])
-            status['maximum'] = int(headers['X-MaxRequestCount'])
-            status['expiration'] = int(headers['X-AuthTokenExpiration'])
-            HashServer.status = status
-        except (KeyError, TypeError, ValueError):
-            pass
+        payload = encode_payload(timestamp, latitude, longitude, accuracy, authticket, sessiondata, requests)
+        response = await self.retry_policy.call(
+            self.endpoint, self._request, payload,
+            exception=HashingCircuitOpenException)
 
         try:
             return (c_int32(response['locationHash']).value,
@@ -131,58 +53,98 @@ class HashServer:
         except Exception as e:
             raise MalformedHashResponseException('Unable to load values from hash response.') from e
 
-    @property
-    def _multi_token(self):
-        return next(self._tokens)
-
-    @property
-    def _multi_status(self):
-        return self.key_statuses[self.instance_token]
+    async def _request(self, payload):
+        try:
+            key = await self.keys.acquire()
+        except KeyError:
+            raise NoHashKeyException(
+                'You must provide a hash key before making a request.')
+        headers = None
+        # request hashes from hashing server, retries are up to retry_policy
+        try:
+            async with self.transport.post(self.endpoint, payload, headers={'X-AuthToken': key.token}) as resp:
+                status = resp.status
+                if status == 400:
+                    key.failures += 1
+
+                    if key.failures < 10:
+                        raise BadHashRequestException('400 was returned from the hashing server.')
+
+                    if len(self.keys) > 1:
+                        self.log.warning(
+                            '{:.10}... expired, removing from rotation.'.format(
+                                key.token))
+                        self.keys.remove(key.token)
+                        return await self._request(payload)
+                    raise ExpiredHashKeyException("{:.10}... appears to have expired.".format(key.token))
+                elif status == 403:
+                    raise TempHashingBanException('Your IP was temporarily banned for sending too many requests with invalid keys')
+                elif status == 429:
+                    key.remaining = 0
+                    raise HashingQuotaExceededException('{:.10}... is out of hashes.'.format(key.token))
+                elif status >= 500 or status == 404:
+                    raise HashingOfflineException(
+                        'Hashing server error {}.'.format(status))
+                elif status != 200:
+                    raise UnexpectedHashResponseException('Unexpected hash code {}.'.format(status))
+                key.failures = 0
+
+                response = json_loads(bytes(resp.body).decode('ascii'))
+                headers = resp.headers
+        except ValueError as e:
+            raise MalformedHashResponseException('Unable to parse JSON from hash server.') from e
+        except (TimeoutError, DisconnectedError) as e:
+            raise HashingTimeoutException('Hashing request timed out.') from e
+        except TransportError as e:
+            raise HashingOfflineException('{} during hashing.'.format(e)) from e
+        finally:
+            self.keys.release(key, headers)
+        HashServer.status = key.as_dict()
+        return response
 
     @classmethod
     def activate_session(cls, conn_limit=300):
-        if cls._session and not cls._session.closed:
+        if cls.transport is not None:
             return
-        conn = TimedConnector(loop=cls.loop,
-                              limit=conn_limit,
-                              verify_ssl=False)
-        headers = (('Content-Type', 'application/json'),
-                   ('Accept', 'application/json'),
-                   ('User-Agent', 'Python aiopogo'))
-        cls._session = ClientSession(connector=conn,
-                                     loop=cls.loop,
-                                     headers=headers,
-                                     raise_for_status=False,
-                                     conn_timeout=4.5,
-                                     json_serialize=json_dumps)
+        # connections are renewed every 7.5 seconds
+        cls.transport = HttpTransport(limit=conn_limit,
+                                      headers=(('Content-Type', 'application/json'),
+                                               ('Accept', 'application/json'),
+                                               ('User-Agent', 'Python aiopogo')),
+                                      conn_timeout=4.5,
+                                      max_age=7.5,
+                                      loop=cls.loop)
+
+    @classmethod
+    async def warmup(cls, n=10):
+        """Open n connections to the hashing server ahead of demand and
+        keep n idle from then on; returns the number opened. See
+        HashServer.transport.status() for the pool fill level.
+        """
+        cls.activate_session()
+        return await cls.transport.warmup(cls.endpoint, n)
 
     @classmethod
     def close_session(cls):
-        if not cls._session or cls._session.closed:
+        transport = cls.transport
+        if transport is None:
             return
-        cls._session.close()
+        cls.transport = None
+        return transport.close()
 
     @classmethod
     def remove_token(cls, token):
-        tokens = set(cls.key_statuses)
-        tokens.discard(token)
-        del cls.key_statuses[token]
-        if len(tokens) > 1:
-            cls.multi = len(tokens)
-            cls._tokens = cycle(tokens)
-        else:
-            cls.multi = False
-            cls.auth_token = tokens.pop()
-            cls.key_status = cls.key_statuses[cls.auth_token]
+        cls.keys.remove(token)
 
     @classmethod
     def set_token(cls, token):
-        if isinstance(token, (tuple, list, set, frozenset)) and len(token) > 1:
-            cls._tokens = cycle(token)
-            cls.auth_token = cls._multi_token
-            cls.multi = len(token)
-            cls.key_statuses = {t: {'failures': 0} for t in token}
-            cls.key_status = cls._multi_status
-        else:
-            cls.auth_token = token
-            cls.key_status = {'failures': 0}
+        """Use one hashing key or, given a sequence, several of them.
+
+        The quota of every key is tracked by HashServer.keys, see
+        KeyScheduler.status for their current state.
+        """
+        if not isinstance(token, (tuple, list, set, frozenset)):
+            token = (token,)
+        cls.keys.keys.clear()
+        for t in token:
+            cls.keys.add(t)
@@ -0,0 +1,138 @@
+from .registry import REQUESTS
+
+GET_INVENTORY = REQUESTS.ids['GET_INVENTORY']
+
+
+class Inventory:
+    '''Inventory of one account kept current from InventoryDelta messages.
+
+    Deltas are applied in place: pokemon are indexed by id and by species,
+    eggs by id, items and candies are kept as counts and the incubators,
+    player stats and pokedex entries are replaced by their latest version.
+    timestamp is the new_timestamp_ms of the last applied delta and is
+    what the next GET_INVENTORY should send as last_timestamp_ms.
+
+    Messages are stored as they are parsed, so they stay linked to the
+    response they came in.
+    '''
+
+    def __init__(self):
+        self.timestamp = 0
+        self.pokemon = {}
+        self.species = {}
+        self.eggs = {}
+        self.items = {}
+        self.candies = {}
+        self.incubators = []
+        self.player_stats = None
+        self.pokedex = {}
+
+    def update(self, response, full=False):
+        '''Apply a GetInventoryResponse or InventoryDelta.
+
+        Pass full=True for the answer to a request with a last_timestamp_ms
+        of 0, which lists the complete inventory and replaces everything
+        that is known. Deltas older than the current state are ignored.
+        Returns whether the delta was applied.
+        '''
+        if not getattr(response, 'success', True):
+            return False
+        delta = getattr(response, 'inventory_delta', response)
+        if full:
+            self.clear()
+        elif delta.new_timestamp_ms < self.timestamp:
+            return False
+
+        for inventory_item in delta.inventory_items:
+            if inventory_item.HasField('deleted_item'):
+                self._remove_pokemon(inventory_item.deleted_item.pokemon_id)
+                continue
+            # InventoryItemData has no oneof but only ever sets one field
+            for field, value in inventory_item.inventory_item_data.ListFields():
+                kind = field.name
+                if kind == 'pokemon_data':
+                    self._add_pokemon(value)
+                elif kind == 'item':
+                    if value.count > 0:
+                        self.items[value.item_id] = value.count
+                    else:
+                        self.items.pop(value.item_id, None)
+                elif kind == 'candy':
+                    self.candies[value.family_id] = value.candy
+                elif kind == 'egg_incubators':
+                    self.incubators = list(value.egg_incubator)
+                elif kind == 'player_stats':
+                    self.player_stats = value
+                elif kind == 'pokedex_entry':
+                    self.pokedex[value.pokemon_id] = value
+
+        self.timestamp = max(self.timestamp, delta.new_timestamp_ms)
+        return True
+
+    def _add_pokemon(self, pokemon):
+        pokemon_id = pokemon.id
+        self._remove_pokemon(pokemon_id)
+        if pokemon.is_egg:
+            self.eggs[pokemon_id] = pokemon
+        else:
+            self.pokemon[pokemon_id] = pokemon
+            self.species.setdefault(pokemon.pokemon_id, {})[pokemon_id] = pokemon
+
+    def _remove_pokemon(self, pokemon_id):
+        pokemon = self.pokemon.pop(pokemon_id, None)
+        if pokemon is not None:
+            same = self.species.get(pokemon.pokemon_id)
+            if same is not None:
+                same.pop(pokemon_id, None)
+                if not same:
+                    del self.species[pokemon.pokemon_id]
+        else:
+            self.eggs.pop(pokemon_id, None)
+
+    def clear(self):
+        '''Forget everything so the next GET_INVENTORY fetches it all.'''
+        self.timestamp = 0
+        self.pokemon.clear()
+        self.species.clear()
+        self.eggs.clear()
+        self.items.clear()
+        self.candies.clear()
+        self.incubators = []
+        self.player_stats = None
+        self.pokedex.clear()
+
+    def prepare(self, subrequests):
+        '''Fill in last_timestamp_ms for every GET_INVENTORY in subrequests
+        that doesn't set it.
+
+        Returns the sub-requests, copied if anything changed, and the set
+        of the positions of those GET_INVENTORY that ask for the complete
+        inventory.
+        '''
+        prepared = None
+        full = set()
+        for index, entry in enumerate(subrequests):
+            if entry == GET_INVENTORY:
+                arguments = {'last_timestamp_ms': self.timestamp}
+            elif (isinstance(entry, tuple) and entry[0] == GET_INVENTORY
+                    and isinstance(entry[1], dict)):
+                arguments = entry[1]
+                if 'last_timestamp_ms' in arguments:
+                    if not arguments['last_timestamp_ms']:
+                        full.add(index)
+                    continue
+                arguments = dict(arguments, last_timestamp_ms=self.timestamp)
+            else:
+                continue
+            if not self.timestamp:
+                full.add(index)
+            if prepared is None:
+                prepared = list(subrequests)
+            prepared[index] = (GET_INVENTORY, arguments)
+        return (subrequests if prepared is None else prepared), full
+
+    def item_count(self, item_id):
+        return self.items.get(item_id, 0)
+
+    def __len__(self):
+        return len(self.pokemon) + len(self.eggs)
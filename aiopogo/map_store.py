@@ -0,0 +1,143 @@
+from array import array
+from collections import OrderedDict
+
+from .utilities import get_time_ms
+
+
+def _detach(message):
+    # submessages keep their whole parent response alive, store a copy
+    copy = message.__class__()
+    copy.CopyFrom(message)
+    return copy
+
+
+class _Cell:
+    __slots__ = ('timestamp', 'forts', 'pokemon')
+
+    def __init__(self):
+        self.timestamp = 0
+        self.forts = {}
+        self.pokemon = {}
+
+
+class MapStore:
+    '''Current map state assembled from GetMapObjectsResponse messages.
+
+    Cells are keyed by s2_cell_id and remember the current_timestamp_ms the
+    server last sent for them, which since_timestamps() turns into the
+    since_timestamp_ms values of the next GET_MAP_OBJECTS request so that
+    only changes are downloaded. Forts are kept by id, wild pokemon by
+    encounter_id until their time_till_hidden_ms runs out.
+
+    At most max_cells cells are kept; the least recently updated ones are
+    dropped first. Pokemon whose despawn time is unknown are kept for
+    unknown_ttl_ms.
+    '''
+
+    def __init__(self, max_cells=None, unknown_ttl_ms=900000):
+        self.max_cells = max_cells
+        self.unknown_ttl_ms = unknown_ttl_ms
+        self.cells = OrderedDict()
+
+    def update(self, response, now=None):
+        '''Apply a GetMapObjectsResponse (or its map_cells) to the store.'''
+        if now is None:
+            now = get_time_ms()
+        map_cells = getattr(response, 'map_cells', response)
+        for map_cell in map_cells:
+            self._update_cell(map_cell, now)
+        if self.max_cells is not None:
+            while len(self.cells) > self.max_cells:
+                self.cells.popitem(last=False)
+
+    def _update_cell(self, map_cell, now):
+        cell_id = map_cell.s2_cell_id
+        try:
+            cell = self.cells.pop(cell_id)
+        except KeyError:
+            cell = _Cell()
+        self.cells[cell_id] = cell
+
+        forts = cell.forts
+        if not cell.timestamp and not map_cell.is_truncated_list:
+            # a complete answer to a request with since_timestamp_ms 0
+            # lists every fort of the cell
+            forts.clear()
+        for fort in map_cell.forts:
+            known = forts.get(fort.id)
+            if known is None or fort.last_modified_timestamp_ms > known.last_modified_timestamp_ms:
+                forts[fort.id] = _detach(fort)
+
+        pokemon = cell.pokemon
+        for wild in map_cell.wild_pokemons:
+            if wild.encounter_id not in pokemon:
+                if 0 < wild.time_till_hidden_ms <= 3600000:
+                    expires = now + wild.time_till_hidden_ms
+                else:
+                    expires = now + self.unknown_ttl_ms
+                pokemon[wild.encounter_id] = expires, _detach(wild)
+
+        for object_id in map_cell.deleted_objects:
+            forts.pop(object_id, None)
+            try:
+                pokemon.pop(int(object_id), None)
+            except ValueError:
+                pass
+
+        # a truncated list is missing changes, so the timestamp is kept and
+        # the next request asks for the same period again
+        if not map_cell.is_truncated_list:
+            cell.timestamp = max(cell.timestamp, map_cell.current_timestamp_ms)
+        self._expire_cell(cell, now)
+
+    @staticmethod
+    def _expire_cell(cell, now):
+        expired = [k for k, (expires, _) in cell.pokemon.items() if expires <= now]
+        for encounter_id in expired:
+            del cell.pokemon[encounter_id]
+
+    def expire(self, now=None):
+        '''Drop every pokemon that has despawned.'''
+        if now is None:
+            now = get_time_ms()
+        for cell in self.cells.values():
+            self._expire_cell(cell, now)
+
+    def since_timestamps(self, cell_ids):
+        '''Return the since_timestamp_ms values for cell_ids as an
+        array('q'), 0 for cells that have not been fetched yet.'''
+        cells = self.cells
+        return array('q', (cells[c].timestamp if c in cells else 0
+                           for c in cell_ids))
+
+    def forts(self, cell_ids=None):
+        for cell in self._select(cell_ids):
+            yield from cell.forts.values()
+
+    def pokemon(self, cell_ids=None, now=None):
+        '''Yield the wild pokemon that have not despawned yet.'''
+        if now is None:
+            now = get_time_ms()
+        for cell in self._select(cell_ids):
+            for expires, wild in cell.pokemon.values():
+                if expires > now:
+                    yield wild
+
+    def _select(self, cell_ids):
+        if cell_ids is None:
+            return list(self.cells.values())
+        return [self.cells[c] for c in cell_ids if c in self.cells]
+
+    def forget(self, cell_ids=None):
+        '''Remove cells, or everything, so they are fetched in full again.'''
+        if cell_ids is None:
+            self.cells.clear()
+        else:
+            for cell_id in cell_ids:
+                self.cells.pop(cell_id, None)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __contains__(self, cell_id):
+        return cell_id in self.cells
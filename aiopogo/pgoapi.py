@@ -12,33 +12,54 @@ except ImportError:
     Socks5Auth = Socks4Auth
 
 from . import __title__, __version__
+from .batching import RequestBatcher
 from .rpc_api import RpcApi, RpcState
 from .auth_ptc import AuthPtc
 from .auth_google import AuthGoogle
 from .hash_server import HashServer
-from .exceptions import AuthTokenExpiredException, InvalidCredentialsException, NoPlayerPositionSetException, ServerApiEndpointRedirectException
-from .pogoprotos.networking.requests.request_type_pb2 import RequestType
-from .pogoprotos.networking.platform.platform_request_type_pb2 import PlatformRequestType
+from .inventory import Inventory
+from .exceptions import AuthException, AuthTokenExpiredException, HashServerException, InvalidCredentialsException, NianticIPBannedException, NoPlayerPositionSetException, ProxyException, ServerApiEndpointRedirectException
+from .registry import PLATFORM_REQUESTS, REQUESTS
+from .retry import RETRY_POLICY
 
 
 class PGoApi:
     log = getLogger(__name__)
     log.info('%s v%s', __title__, __version__)
+    # retry budgets, backoff and circuit breakers of RPC calls
+    retry_policy = RETRY_POLICY
 
-    def __init__(self, lat=None, lon=None, alt=None, proxy=None, device_info=None):
+    def __init__(self, lat=None, lon=None, alt=None, proxy=None, device_info=None, batch_window=None, batch_limit=20, track_inventory=False, proxy_pool=None):
         self.auth_provider = None
         self.state = RpcState()
 
-        self._api_endpoint = 'https://pgorelease.nianticlabs.com/plfe/rpc'
+        # concurrent calls within batch_window seconds share one envelope
+        if batch_window is None:
+            self._batcher = None
+        else:
+            self._batcher = RequestBatcher(self, batch_window, batch_limit)
+
+        # keeps the inventory current and turns GET_INVENTORY into deltas
+        self.inventory = Inventory() if track_inventory else None
+
+        self._api_endpoint = URL('https://pgorelease.nianticlabs.com/plfe/rpc')
 
         self.latitude = lat
         self.longitude = lon
         self.altitude = alt
 
         self.proxy_auth = None
-        self.proxy = proxy
+        self._proxy = None
         self.device_info = device_info
 
+        # a ProxyPool picks the proxy and replaces it when it goes bad,
+        # it raises ProxyException if none is healthy
+        self.proxy_pool = proxy_pool
+        if proxy is None and proxy_pool is not None:
+            proxy_pool.assign(self)
+        else:
+            self.proxy = proxy
+
     async def set_authentication(self, provider='ptc', username=None, password=None, timeout=10, locale='en_US', refresh_token=None):
         if provider == 'ptc':
             self.auth_provider = AuthPtc(
@@ -67,11 +88,115 @@ class PGoApi:
     def create_request(self):
         return PGoApiRequest(self)
 
+    async def _call(self, subrequests, subplatforms, split=None):
+        position = self.position
+        try:
+            assert position[0] is not None and position[1] is not None
+        except AssertionError:
+            raise NoPlayerPositionSetException('No position set.')
+
+        inventory = self.inventory
+        if inventory is not None:
+            subrequests, full_inventory = inventory.prepare(subrequests)
+
+        request = RpcApi(self.auth_provider, self.state)
+        # hashing and login errors were already retried by their own calls
+        response = await self.retry_policy.call(
+            self._api_endpoint.host, self._request, request, subrequests,
+            subplatforms, position, split,
+            passthrough=(HashServerException, AuthException))
+
+        if inventory is not None:
+            # batched callers may mix full requests and deltas, each group
+            # is applied as what its own GET_INVENTORY asked for
+            start = 0
+            for size, responses in zip(split or (len(subrequests),),
+                                       response if split else (response,)):
+                if 'GET_INVENTORY' in responses:
+                    full = any(start <= i < start + size for i in full_inventory)
+                    inventory.update(responses['GET_INVENTORY'], full)
+                start += size
+
+        return response, request.timings
+
+    async def _request(self, request, subrequests, subplatforms, position, split):
+        proxy = self._proxy
+        try:
+            response = await request.request(self.api_endpoint, subrequests, subplatforms, position, self.device_info, proxy, self.proxy_auth, split)
+            if self.proxy_pool is not None and proxy is not None:
+                self.proxy_pool.success(proxy, request.timings.get('rpc'))
+            return response
+        except (ProxyException, NianticIPBannedException) as e:
+            if self.proxy_pool is not None and proxy is not None:
+                self.proxy_pool.failure(
+                    proxy, banned=isinstance(e, NianticIPBannedException))
+            raise
+        except AuthTokenExpiredException:
+            self.log.info('Access token rejected! Requesting new one...')
+            await self.auth_provider.get_access_token(force_refresh=True)
+            raise
+        except ServerApiEndpointRedirectException as e:
+            self.log.debug('API endpoint redirect... re-executing call')
+            self.api_endpoint = e.endpoint
+            raise
+
+    async def warmup(self, connections=1):
+        """Open connections to the RPC endpoint, through the proxy if one is
+        set, before the first call needs them, and keep that many idle
+        from then on. Returns the number of connections opened.
+
+        See RpcApi.get_transport(proxy).status() for the pool fill level.
+        """
+        return await RpcApi.get_transport(self._proxy).warmup(
+            self._api_endpoint, connections, self._proxy, self.proxy_auth)
+
+    def _submit(self, subrequests, subplatforms):
+        if self._batcher is None:
+            return self._call(subrequests, subplatforms)
+        return self._batcher.submit(subrequests, subplatforms)
+
+    async def call_bundle(self, bundle, **arguments):
+        """Execute a RequestBundle, see RequestBundle.build for arguments."""
+        subrequests, subplatforms = bundle.build(**arguments)
+        response, _ = await self._submit(subrequests, subplatforms)
+        return response
+
     @staticmethod
     def activate_hash_server(hash_token, conn_limit=300):
         HashServer.set_token(hash_token)
         HashServer.activate_session(conn_limit)
 
+    @staticmethod
+    def set_hash_backend(backend):
+        """Compute signature hashes with a HashBackend instead of the
+        default HashServer, e.g. a CallableHashBackend or a HashServer for
+        a self-hosted server. Pass None to use the default again.
+        """
+        RpcApi.hash_backend = backend
+
+    @staticmethod
+    def set_transport(transport):
+        """Send RPCs without a proxy through a Transport, e.g. an
+        RpcTransport, instead of the aiohttp SESSIONS. Pass None to use
+        them again.
+        """
+        RpcApi.transport = transport
+
+    @staticmethod
+    def set_executor(executor, offload_threshold=65536):
+        """Decode RPC responses of at least offload_threshold bytes, such as
+        DOWNLOAD_GM_TEMPLATES or dense GET_MAP_OBJECTS, in a thread pool
+        executor instead of on the event loop: the envelope and every
+        sub-response of at least that size are parsed in a worker thread.
+
+        A process pool would need the messages pickled on the loop, so it
+        only encrypts signals of at least offload_threshold bytes, as any
+        executor does; signals are a few hundred bytes. Pass None to run
+        everything on the event loop again.
+        """
+        RpcApi.executor = executor
+        RpcApi.offload_threshold = offload_threshold
+
     @property
     def position(self):
         return self.latitude, self.longitude, self.altitude
@@ -93,6 +218,7 @@ class PGoApi:
 
     @proxy.setter
     def proxy(self, proxy):
+        self.proxy_auth = None
         if proxy is None:
             self._proxy = proxy
         else:
@@ -111,17 +237,26 @@ class PGoApi:
                     raise ValueError(
                         'Proxy protocol must be http, socks5, or socks4.')
 
+        # the auth provider logs in through the same proxy
+        auth = self.auth_provider
+        if isinstance(auth, AuthPtc):
+            auth.proxy = self._proxy
+            auth.proxy_auth = self.proxy_auth
+            auth.socks = self._proxy and self._proxy.scheme in ('socks4', 'socks5')
+        elif isinstance(auth, AuthGoogle):
+            auth._proxy = self._proxy
+
     @property
     def start_time(self):
         return self.state.start_time
 
-    def __getattr__(self, func):
+    def __getattr__(self, func, _request_ids=REQUESTS.ids):
         async def function(**kwargs):
             request = self.create_request()
             getattr(request, func)(**kwargs)
             return await request.call()
 
-        if func.upper() in RequestType.keys():
+        if func.upper() in _request_ids:
             return function
         else:
             raise AttributeError('{} not known.'.format(func))
@@ -134,27 +269,14 @@ class PGoApiRequest:
         self.__parent__ = parent
         self._req_method_list = []
         self._req_platform_list = []
+        self.timings = None
 
     async def call(self):
-        parent = self.__parent__
-        auth_provider = parent.auth_provider
-        position = parent.position
-        try:
-            assert position[0] is not None and position[1] is not None
-        except AssertionError:
-            raise NoPlayerPositionSetException('No position set.')
+        response, timings = await self.__parent__._submit(
+            self._req_method_list, self._req_platform_list)
 
-        request = RpcApi(auth_provider, parent.state)
-        while True:
-            try:
-                response = await request.request(parent.api_endpoint, self._req_method_list, self._req_platform_list, position, parent.device_info, parent._proxy, parent.proxy_auth)
-                break
-            except AuthTokenExpiredException:
-                self.log.info('Access token rejected! Requesting new one...')
-                await auth_provider.get_access_token(force_refresh=True)
-            except ServerApiEndpointRedirectException as e:
-                self.log.debug('API endpoint redirect... re-executing call')
-                parent.api_endpoint = e.endpoint
+        # stage durations of the last attempt, see RpcApi.request
+        self.timings = timings
 
         # cleanup after call execution
         self._req_method_list = []
@@ -163,31 +285,29 @@ class PGoApiRequest:
 
     def list_curr_methods(self):
         for i in self._req_method_list:
-            print("{} ({})".format(RequestType.Name(i), i))
+            print("{} ({})".format(REQUESTS.names[i], i))
 
-    def __getattr__(self, func):
+    def __getattr__(self, func, _request_ids=REQUESTS.ids, _platform_ids=PLATFORM_REQUESTS.ids):
         func = func.upper()
+        if func in _request_ids:
+            type_id = _request_ids[func]
+            platform = False
+        elif func in _platform_ids:
+            type_id = _platform_ids[func]
+            platform = True
+        else:
+            raise AttributeError('{} not known.'.format(func))
 
         def function(**kwargs):
             self.log.debug('Creating a new request...')
 
-            try:
-                if func in RequestType.keys():
-                    if kwargs:
-                        self._req_method_list.append((RequestType.Value(func), kwargs))
-                        self.log.debug("Arguments of '%s': \n\r%s", func, kwargs)
-                    else:
-                        self._req_method_list.append(RequestType.Value(func))
-                        self.log.debug("Adding '%s' to RPC request", func)
-                elif func in PlatformRequestType.keys():
-                    if kwargs:
-                        self._req_platform_list.append((PlatformRequestType.Value(func), kwargs))
-                        self.log.debug("Arguments of '%s': \n\r%s", func, kwargs)
-                    else:
-                        self._req_platform_list.append(PlatformRequestType.Value(func))
-                        self.log.debug("Adding '%s' to RPC request", func)
-            except ValueError:
-                raise AttributeError('{} not known.'.format(func))
+            target = self._req_platform_list if platform else self._req_method_list
+            if kwargs:
+                target.append((type_id, kwargs))
+                self.log.debug("Arguments of '%s': \n\r%s", func, kwargs)
+            else:
+                target.append(type_id)
+                self.log.debug("Adding '%s' to RPC request", func)
 
             return self
 
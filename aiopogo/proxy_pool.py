@@ -0,0 +1,165 @@
+from logging import getLogger
+from time import monotonic
+from weakref import WeakSet
+
+from yarl import URL
+
+from .exceptions import ProxyException
+
+
+class ProxyStats:
+    '''Health of one proxy as seen by ProxyPool.'''
+    __slots__ = ('proxy', 'successes', 'failures', 'bans', 'latency',
+                 'consecutive', 'quarantines', 'quarantined_until', 'apis')
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.bans = 0
+        # exponentially weighted moving average of the RPC round trip
+        self.latency = None
+        self.consecutive = 0
+        self.quarantines = 0
+        self.quarantined_until = 0.0
+        self.apis = WeakSet()
+
+    @property
+    def success_rate(self):
+        total = self.successes + self.failures
+        return self.successes / total if total else 1.0
+
+    def as_dict(self):
+        return {'successes': self.successes, 'failures': self.failures,
+                'bans': self.bans, 'success_rate': self.success_rate,
+                'latency': self.latency, 'quarantined_until': self.quarantined_until,
+                'assigned': len(self.apis)}
+
+    @property
+    def name(self):
+        '''The proxy URL without its password, for logs and status().'''
+        return str(URL(self.proxy).with_password(None))
+
+    def __repr__(self):
+        return '<ProxyStats {} {:.0%}>'.format(self.name, self.success_rate)
+
+
+class ProxyPool:
+    '''Assigns proxies to PGoApi instances and moves them off bad ones.
+
+    Calls report their outcome per proxy. A proxy that fails
+    quarantine_after times in a row, or gets a 403 from Niantic, is
+    quarantined for cool_down seconds, doubled with every further
+    quarantine up to max_cool_down, and every PGoApi on it is moved to
+    the least loaded healthy proxy. Proxies are given as URL strings or
+    URLs and keyed by their normalized URL string.
+    '''
+    log = getLogger('proxies')
+
+    def __init__(self, proxies=(), alpha=0.2, quarantine_after=3,
+                 cool_down=60.0, max_cool_down=3600.0):
+        self.proxies = {}
+        self.alpha = alpha
+        self.quarantine_after = quarantine_after
+        self.cool_down = cool_down
+        self.max_cool_down = max_cool_down
+        for proxy in proxies:
+            self.add(proxy)
+
+    @staticmethod
+    def _key(proxy):
+        # the URL that PGoApi.proxy turns the proxy into
+        return str(URL(proxy))
+
+    def add(self, proxy):
+        proxy = self._key(proxy)
+        if proxy not in self.proxies:
+            self.proxies[proxy] = ProxyStats(proxy)
+
+    def remove(self, proxy):
+        stats = self.proxies.pop(self._key(proxy), None)
+        if stats is not None:
+            self._reassign(stats)
+
+    def _healthy(self, now):
+        return [stats for stats in self.proxies.values()
+                if stats.quarantined_until <= now]
+
+    def get(self, exclude=None):
+        '''Return the least loaded healthy proxy, the most reliable and
+        fastest first among equals, or None if all are quarantined.'''
+        if exclude is not None:
+            exclude = self._key(exclude)
+        candidates = [stats for stats in self._healthy(monotonic())
+                      if stats.proxy != exclude]
+        if not candidates:
+            return None
+        best = min(candidates, key=lambda s: (
+            len(s.apis), -s.success_rate, s.latency or 0.0))
+        return best.proxy
+
+    def assign(self, api, exclude=None):
+        '''Set api.proxy to a healthy proxy and return it; raises
+        ProxyException if all are quarantined.'''
+        proxy = self.get(exclude)
+        if proxy is None:
+            raise ProxyException('No healthy proxies left.')
+        self._detach(api)
+        self.proxies[proxy].apis.add(api)
+        api.proxy = proxy
+        return proxy
+
+    def _detach(self, api):
+        current = api.proxy
+        if current is not None:
+            stats = self.proxies.get(self._key(current))
+            if stats is not None:
+                stats.apis.discard(api)
+
+    def success(self, proxy, latency=None):
+        stats = self.proxies.get(self._key(proxy))
+        if stats is None:
+            return
+        stats.successes += 1
+        stats.consecutive = 0
+        stats.quarantines = 0
+        if latency is not None:
+            stats.latency = latency if stats.latency is None else (
+                self.alpha * latency + (1 - self.alpha) * stats.latency)
+
+    def failure(self, proxy, banned=False):
+        '''Count a failed call and quarantine the proxy if needed.'''
+        stats = self.proxies.get(self._key(proxy))
+        if stats is None:
+            return
+        stats.failures += 1
+        stats.consecutive += 1
+        if banned:
+            stats.bans += 1
+        if banned or stats.consecutive >= self.quarantine_after:
+            self._quarantine(stats)
+
+    def _quarantine(self, stats):
+        duration = min(self.cool_down * 2 ** stats.quarantines, self.max_cool_down)
+        stats.quarantines += 1
+        stats.consecutive = 0
+        stats.quarantined_until = monotonic() + duration
+        self.log.warning('Quarantining proxy %s for %.1fs.', stats.name, duration)
+        self._reassign(stats)
+
+    def _reassign(self, stats):
+        for api in list(stats.apis):
+            try:
+                self.assign(api, exclude=stats.proxy)
+            except ProxyException:
+                # the rest stay put and fail until a proxy recovers
+                self.log.warning('No healthy proxies left.')
+                break
+
+    def status(self):
+        '''Return the health of every proxy, keyed by its URL without the
+        password.'''
+        return {stats.name: stats.as_dict() for stats in self.proxies.values()}
+
+    def __len__(self):
+        return len(self.proxies)
@@ -0,0 +1,59 @@
+from importlib import import_module
+
+from .utilities import to_camel_case
+from .pogoprotos.networking.requests.request_type_pb2 import RequestType
+from .pogoprotos.networking.platform.platform_request_type_pb2 import PlatformRequestType
+
+
+def _load_class(package, proto_name):
+    try:
+        module = import_module('{}.{}_pb2'.format(package, proto_name))
+        return getattr(module, to_camel_case(proto_name))
+    except (ImportError, AttributeError):
+        return None
+
+
+class MessageRegistry(dict):
+    '''Maps request type ids to (request class, response class) tuples.
+
+    Classes are imported the first time a type is used and cached, so every
+    later lookup is a single dict access. A side that has no proto is None.
+    '''
+    __slots__ = ('names', 'ids', 'request_package', 'request_suffix',
+                 'response_package', 'files')
+
+    def __init__(self, enum, request_package, request_suffix,
+                 response_package, files=None):
+        super().__init__()
+        self.names = {number: name for name, number in enum.items()}
+        self.ids = dict(enum.items())
+        self.request_package = request_package
+        self.request_suffix = request_suffix
+        self.response_package = response_package
+        self.files = files or {}
+
+    def __missing__(self, type_id):
+        try:
+            proto_name = self.files.get(type_id) or self.names[type_id].lower()
+        except KeyError:
+            raise ValueError('Unknown request type: {}'.format(type_id))
+        self[type_id] = entry = (
+            _load_class(self.request_package, proto_name + self.request_suffix),
+            _load_class(self.response_package, proto_name + '_response'))
+        return entry
+
+
+REQUESTS = MessageRegistry(
+    RequestType,
+    'pogoprotos.networking.requests.messages', '_message',
+    'pogoprotos.networking.responses',
+    files={
+        RequestType.Value('DOWNLOAD_GAME_MASTER_TEMPLATES'): 'download_gm_templates',
+        RequestType.Value('REGISTER_PUSH_NOTIFICATION'): 'push_notification_registry',
+        RequestType.Value('UPDATE_NOTIFICATION_STATUS'): 'update_notification'})
+
+PLATFORM_REQUESTS = MessageRegistry(
+    PlatformRequestType,
+    'pogoprotos.networking.platform.requests', '_request',
+    'pogoprotos.networking.platform.responses',
+    files={PlatformRequestType.Value('BUY_ITEM_POKECOINS'): 'buy_item_poke_coins'})
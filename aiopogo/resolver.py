@@ -0,0 +1,79 @@
+from asyncio import ensure_future, shield
+from socket import AF_INET
+from time import monotonic
+
+from aiohttp.abc import AbstractResolver
+from aiohttp.resolver import DefaultResolver
+
+
+class DnsCache(AbstractResolver):
+    '''Caches DNS resolutions for ttl seconds and shares them between all
+    connectors it is given to, so a fleet of sessions resolves each host
+    once instead of once per connection pool. Concurrent lookups of the
+    same host wait for a single query.
+
+    Lookups go through aiohttp's default resolver, which uses aiodns if
+    it is installed.
+    '''
+
+    def __init__(self, ttl=60.0):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._cache = {}
+        self._pending = {}
+        self._resolver = None
+
+    async def resolve(self, host, port=0, family=AF_INET):
+        key = (host, port, family)
+        try:
+            hosts, expires = self._cache[key]
+        except KeyError:
+            pass
+        else:
+            if expires > monotonic():
+                self.hits += 1
+                return list(hosts)
+            del self._cache[key]
+
+        lookup = self._pending.get(key)
+        if lookup is None:
+            self.misses += 1
+            lookup = self._pending[key] = ensure_future(self._lookup(key))
+        else:
+            self.hits += 1
+        # a waiter that times out mustn't cancel the lookup for the others
+        return list(await shield(lookup))
+
+    async def _lookup(self, key):
+        if self._resolver is None:
+            self._resolver = DefaultResolver()
+        try:
+            hosts = await self._resolver.resolve(*key)
+            self._cache[key] = (hosts, monotonic() + self.ttl)
+            return hosts
+        finally:
+            del self._pending[key]
+
+    def clear(self, host=None):
+        '''Forget all resolutions, or only those of host.'''
+        if host is None:
+            self._cache.clear()
+        else:
+            for key in [key for key in self._cache if key[0] == host]:
+                del self._cache[key]
+
+    def status(self):
+        now = monotonic()
+        return {'hits': self.hits, 'misses': self.misses,
+                'hosts': sum(1 for _, expires in self._cache.values() if expires > now)}
+
+    async def close(self):
+        self._cache.clear()
+        resolver = self._resolver
+        self._resolver = None
+        if resolver is not None:
+            await resolver.close()
+
+
+DNS_CACHE = DnsCache()
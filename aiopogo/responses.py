@@ -0,0 +1,67 @@
+from collections.abc import MutableMapping
+
+
+class _Pending:
+    __slots__ = ('class_', 'raw')
+
+    def __init__(self, class_, raw):
+        self.class_ = class_
+        self.raw = raw
+
+
+class LazyResponses(MutableMapping):
+    '''Sub-responses of an RPC, decoded the first time each one is accessed.
+
+    Behaves like the dict of messages that was returned before. Entries that
+    have no response proto are returned as raw bytes.
+    '''
+    __slots__ = ('_messages',)
+
+    def __init__(self):
+        self._messages = {}
+
+    def add(self, name, class_, raw):
+        self._messages[name] = _Pending(class_, raw)
+
+    def decode(self, min_size=0):
+        '''Decode the pending sub-responses of at least min_size bytes now.'''
+        for name, message in list(self._messages.items()):
+            if (isinstance(message, _Pending) and message.class_ is not None
+                    and len(message.raw) >= min_size):
+                self[name]
+
+    def raw(self, name):
+        '''Return the serialized bytes of a sub-response without decoding it.'''
+        message = self._messages[name]
+        if isinstance(message, _Pending):
+            return message.raw
+        return message.SerializeToString()
+
+    def __getitem__(self, name):
+        message = self._messages[name]
+        if isinstance(message, _Pending):
+            if message.class_ is None:
+                return message.raw
+            raw = message.raw
+            message = message.class_()
+            message.ParseFromString(raw)
+            self._messages[name] = message
+        return message
+
+    def __setitem__(self, name, message):
+        self._messages[name] = message
+
+    def __delitem__(self, name):
+        del self._messages[name]
+
+    def __contains__(self, name):
+        return name in self._messages
+
+    def __iter__(self):
+        return iter(self._messages)
+
+    def __len__(self):
+        return len(self._messages)
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, list(self._messages))
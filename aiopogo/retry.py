@@ -0,0 +1,169 @@
+from asyncio import CancelledError, sleep
+from logging import getLogger
+from random import uniform
+from time import monotonic
+
+from .exceptions import AuthConnectionException, AuthTimeoutException, AuthTokenExpiredException, BadHashRequestException, CircuitOpenException, HashingOfflineException, HashingQuotaExceededException, HashingTimeoutException, NianticOfflineException, NianticTimeoutException, ProxyException, ServerApiEndpointRedirectException, ServerBusyOrOfflineException, TimeoutException
+
+# retries allowed per call for each error class, the most specific class
+# of an exception that is listed decides
+DEFAULT_RETRIES = {
+    AuthTokenExpiredException: 3,
+    ServerApiEndpointRedirectException: 3,
+    NianticTimeoutException: 1,
+    NianticOfflineException: 1,
+    # a ProxyPool may have moved the account to another proxy meanwhile
+    ProxyException: 1,
+    HashingQuotaExceededException: 3,
+    BadHashRequestException: 2,
+    HashingTimeoutException: 2,
+    HashingOfflineException: 2,
+    AuthTimeoutException: 1,
+    AuthConnectionException: 1,
+}
+
+
+class CircuitBreaker:
+    '''Sheds calls to a server after threshold consecutive failures.
+
+    Once open, calls fail immediately until reset_timeout seconds have
+    passed. Then a single call is let through: if it succeeds the circuit
+    closes, if it fails it stays open for another reset_timeout.
+    '''
+    __slots__ = ('name', 'threshold', 'reset_timeout', 'failures', 'opened_at', 'probing')
+
+    def __init__(self, name, threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self, exception=CircuitOpenException):
+        if self.opened_at is None:
+            return
+        if not self.probing and monotonic() - self.opened_at >= self.reset_timeout:
+            self.probing = True
+            return
+        raise exception('{} is failing, calls are shed.'.format(self.name))
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = monotonic()
+        self.probing = False
+
+    def release(self):
+        '''End a call that neither succeeded nor failed.'''
+        self.probing = False
+
+    def __repr__(self):
+        return '<CircuitBreaker {} {}>'.format(
+            self.name, 'open' if self.opened_at is not None else 'closed')
+
+
+class RetryPolicy:
+    '''Decides how often and how fast failed calls are retried.
+
+    retries maps error classes to the number of retries a single call may
+    spend on them, errors of other classes are raised at once. Retries
+    wait a random time up to base * 2 ** retry seconds, at most cap,
+    except for the immediate classes whose cause is fixed before the
+    retry (a refreshed token, a new endpoint, another hashing key).
+
+    Every server gets a CircuitBreaker; ServerBusyOrOfflineException and
+    TimeoutException count as its failures, other errors as answers.
+    '''
+    log = getLogger('retry')
+    immediate = (AuthTokenExpiredException, ServerApiEndpointRedirectException,
+                 HashingQuotaExceededException)
+    outages = (ServerBusyOrOfflineException, TimeoutException)
+
+    def __init__(self, retries=None, base=0.5, cap=10.0, threshold=5, reset_timeout=30.0):
+        self.retries = DEFAULT_RETRIES.copy() if retries is None else retries
+        self.base = base
+        self.cap = cap
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.breakers = {}
+
+    def breaker(self, name):
+        try:
+            return self.breakers[name]
+        except KeyError:
+            breaker = self.breakers[name] = CircuitBreaker(
+                name, self.threshold, self.reset_timeout)
+            return breaker
+
+    def budget(self, error):
+        '''Return the class that accounts for error and its retry budget.'''
+        for cls in type(error).__mro__:
+            if cls in self.retries:
+                return cls, self.retries[cls]
+        return None, 0
+
+    def backoff(self, retry):
+        '''Full jitter: anywhere from 0 to the exponential delay.'''
+        return uniform(0, min(self.cap, self.base * 2 ** retry))
+
+    async def call(self, name, func, *args, exception=CircuitOpenException, passthrough=()):
+        '''Await func(*args), retrying within the budgets.
+
+        name is the server whose breaker guards the call; while it is open
+        exception is raised without calling func. Errors of the passthrough
+        classes come from another server whose own call already retried
+        them, they are raised at once and don't count for this breaker.
+        '''
+        breaker = self.breaker(name)
+        spent = {}
+        retry = 0
+        while True:
+            breaker.allow(exception)
+            try:
+                result = await func(*args)
+            except CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if passthrough and isinstance(e, passthrough):
+                    breaker.release()
+                    raise
+                if isinstance(e, ProxyException):
+                    # says nothing about the server
+                    breaker.release()
+                elif isinstance(e, self.outages):
+                    breaker.failure()
+                else:
+                    # the server answered, even if with an error
+                    breaker.success()
+                cls, budget = self.budget(e)
+                if spent.get(cls, 0) >= budget:
+                    raise
+                spent[cls] = spent.get(cls, 0) + 1
+                if not isinstance(e, self.immediate):
+                    delay = self.backoff(retry)
+                    retry += 1
+                    self.log.info('%s on %s, retrying in %.2fs.',
+                                  e.__class__.__name__, name, delay)
+                    await sleep(delay)
+            else:
+                breaker.success()
+                return result
+
+    def status(self):
+        '''Return the state of every circuit breaker, keyed by name.'''
+        return {name: {'open': breaker.is_open, 'failures': breaker.failures}
+                for name, breaker in self.breakers.items()}
+
+
+RETRY_POLICY = RetryPolicy()
@@ -1,23 +1,28 @@
 from array import array
-from asyncio import TimeoutError
+from asyncio import TimeoutError, sleep
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from importlib import import_module
 from logging import getLogger
 from os import urandom
 from os.path import join
 from datetime import datetime
+from time import monotonic
 import json
 import base64
 
-from aiohttp import ClientError, ClientHttpProxyError, ClientProxyConnectionError, ClientResponseError, ServerTimeoutError
 from cyrandom import choose_weighted, randint, random, triangular, triangular_int, uniform
 from google.protobuf.message import DecodeError
 from pycrypt import pycrypt
 
+from .builders import BUILDERS
 from .exceptions import *
 from .hash_server import HashServer
+from .registry import PLATFORM_REQUESTS, REQUESTS
+from .responses import LazyResponses
 from .session import SESSIONS
+from .transport import HttpTransport, TransportError
 from .utilities import to_camel_case, get_time_ms, IdGenerator
+from .wire import merge_fields, read_envelope_status
 
 from .pogoprotos.networking.envelopes.request_envelope_pb2 import RequestEnvelope
 from .pogoprotos.networking.envelopes.response_envelope_pb2 import ResponseEnvelope
@@ -26,57 +31,57 @@ from .pogoprotos.networking.platform.requests.send_encrypted_signature_request_p
 from .pogoprotos.networking.platform.requests.plat_eight_request_pb2 import PlatEightRequest
 from .pogoprotos.networking.platform.responses.plat_eight_response_pb2 import PlatEightResponse
 from .pogoprotos.networking.requests.request_type_pb2 import RequestType
-from .pogoprotos.networking.platform.platform_request_type_pb2 import PlatformRequestType
+
+
+def _raise_status(status):
+    if status == 400:
+        raise BadRequestException('400: Bad RPC request.')
+    elif status == 403:
+        raise NianticIPBannedException(
+            "Seems your IP Address is banned or something else went badly wrong.")
+    elif status >= 500:
+        raise NianticOfflineException(
+            '{} Niantic server error.'.format(status))
+    raise UnexpectedResponseException(
+        'Unexpected RPC response: {}'.format(status))
 
 
 class RpcApi:
     log = getLogger(__name__)
+    # responses of at least offload_threshold bytes are decoded in this
+    # concurrent.futures executor if it is a thread pool, signals of at
+    # least that size are encrypted in it with any executor
+    executor = None
+    offload_threshold = 65536
+    # HashBackend used for the signature, a HashServer if None
+    hash_backend = None
+    # Transport used for requests without a proxy, e.g. an RpcTransport;
+    # if None, and always with a proxy, the SESSIONS are used through aiohttp
+    transport = None
+    sessions_transport = HttpTransport(SESSIONS)
 
     def __init__(self, auth_provider, state):
         self._auth_provider = auth_provider
         self.state = state
         self.request_id = self.state.request_id
+        self.timings = {}
 
-    async def _make_rpc(self, endpoint, proto, proxy, proxy_auth, _sessions=SESSIONS):
-        try:
-            # temps = '{}'.format(datetime.now().strftime("%Y%m%d%H%M%S%f"))
-            # location = join('data', '{}.req.bin'.format(temps))
-            # payload = {
-            #     'data': base64.b64encode(proto.SerializeToString()).decode('utf-8'),
-            # }
-            # with open(location, 'w') as f:
-            #     json.dump(payload, f)
-            async with _sessions.get(proxy).post(endpoint, data=proto.SerializeToString(), proxy=proxy, proxy_auth=proxy_auth) as resp:
-                # location = join('data', '{}.res.bin'.format(temps))
-                r = await resp.read()
-                # with open(location, 'wb') as f:
-                #     f.write(base64.b64encode(r))
-                return r
-        except (ClientHttpProxyError, ClientProxyConnectionError, SocksError) as e:
-            raise ProxyException(
-                'Proxy connection error during RPC request.') from e
-        except ClientResponseError as e:
-            if e.code == 400:
-                raise BadRequestException(
-                    "400: Bad RPC request. {}".format(
-                        e.message))
-            elif e.code == 403:
-                raise NianticIPBannedException(
-                    "Seems your IP Address is banned or something else went badly wrong.")
-            elif e.code >= 500:
-                raise NianticOfflineException(
-                    '{} Niantic server error: {}'.format(
-                        e.code, e.message))
-            else:
-                raise UnexpectedResponseException(
-                    'Unexpected RPC response: {}, {}'.format(
-                        e.code, e.message))
-        except (TimeoutError, ServerTimeoutError) as e:
-            raise NianticTimeoutException('RPC request timed out.') from e
-        except ClientError as e:
-            raise NianticOfflineException(
-                '{} during RPC. {}'.format(
-                    e.__class__.__name__, e)) from e
+    @classmethod
+    def get_transport(cls, proxy=None):
+        if proxy is None and cls.transport is not None:
+            return cls.transport
+        return cls.sessions_transport
+
+    async def _offload(self, size, func, *args):
+        """Call func in the executor if one is set and size is large enough.
+
+        Small payloads aren't worth the hand-off and are handled inline.
+        func must take and return bytes: anything else would be pickled on
+        the loop for a process pool, costing more than it saves.
+        """
+        if self.executor is None or size < self.offload_threshold:
+            return func(*args)
+        return await HashServer.loop.run_in_executor(self.executor, func, *args)
 
     @staticmethod
     def get_request_name(subrequests):
@@ -89,146 +94,185 @@ class RpcApi:
         except (ValueError, TypeError):
             return 'unknown'
 
-    async def request(self, endpoint, subrequests, subplatforms, player_position, device_info=None, proxy=None, proxy_auth=None):
+    async def request(self, endpoint, subrequests, subplatforms, player_position, device_info=None, proxy=None, proxy_auth=None, split=None):
+        timings = self.timings
+        start = monotonic()
         request_proto = await self._build_main_request(subrequests, subplatforms, player_position, device_info)
+        data = request_proto.SerializeToString()
+        built = monotonic()
 
-        response = await self._make_rpc(endpoint, request_proto, proxy, proxy_auth)
-        return self._parse_response(response, subrequests, subplatforms)
+        transport = self.get_transport(proxy)
+        try:
+            # the body may be a view of the connection's buffer, parse it
+            # before the connection is handed to the next request
+            async with transport.post(endpoint, data, proxy=proxy, proxy_auth=proxy_auth) as response:
+                received = monotonic()
+                if response.status != 200:
+                    _raise_status(response.status)
+                responses = await self._parse_response(response.body, subrequests, subplatforms, split)
+        except TimeoutError as e:
+            raise NianticTimeoutException('RPC request timed out.') from e
+        except TransportError as e:
+            raise NianticOfflineException('{} during RPC.'.format(e)) from e
+        end = monotonic()
+
+        timings['build'] = built - start
+        timings['rpc'] = received - built
+        timings['parse'] = end - received
+        timings['total'] = end - start
+        self.log.debug(
+            'Critical path: %.1fms waiting for auth, %.1fms waiting for hash '
+            '(%.1fms in flight), %.1fms build, %.1fms RPC, %.1fms parse, '
+            '%.1fms total', timings.get('auth_wait', 0) * 1000,
+            timings['hash_wait'] * 1000, timings['hash'] * 1000,
+            timings['build'] * 1000, timings['rpc'] * 1000,
+            timings['parse'] * 1000, timings['total'] * 1000)
+        return responses
 
     async def _build_main_request(self, subrequests, subplatforms, player_position, device_info=None):
         self.log.debug('Generating main RPC request...')
+        timings = self.timings
+        loop = HashServer.loop
 
-        request = RequestEnvelope()
-        request.status_code = 2
+        if self._auth_provider.check_ticket():
+            token = None
+        else:
+            # start the login round trip first and let it reach its first
+            # network wait, so it overlaps with building the request
+            token = loop.create_task(self._auth_provider.get_access_token())
+            await sleep(0)
 
-        request.request_id = self.request_id
+        try:
+            request = RequestEnvelope()
+            request.status_code = 2
 
-        # 5: 43%, 10: 30%, 30: 5%, 50: 4%, 65: 10%, 200: 1%, float: 7%
-        request.accuracy = choose_weighted(
-            (5, 10, 30, 50, 65, 200, -1),
-            (43, 73, 78, 82, 92, 93, 100))
-        if request.accuracy == -1:
-            request.accuracy = uniform(65, 200)
+            request.request_id = self.request_id
 
-        request.latitude, request.longitude, altitude = player_position
+            # 5: 43%, 10: 30%, 30: 5%, 50: 4%, 65: 10%, 200: 1%, float: 7%
+            request.accuracy = choose_weighted(
+                (5, 10, 30, 50, 65, 200, -1),
+                (43, 73, 78, 82, 92, 93, 100))
+            if request.accuracy == -1:
+                request.accuracy = uniform(65, 200)
 
-        # generate sub requests before SignalLog generation
-        request = self._build_sub_requests(request, subrequests, subplatforms)
+            request.latitude, request.longitude, altitude = player_position
 
-        if self._auth_provider.check_ticket():
-            self.log.debug(
-                'Found Session Ticket - using this instead of oauth token')
-            request.auth_ticket.expire_timestamp_ms, request.auth_ticket.start, request.auth_ticket.end = self._auth_provider.get_ticket()
-            ticket_serialized = request.auth_ticket.SerializeToString()
-        else:
-            self.log.debug(
-                'No Session Ticket found - using OAUTH Access Token')
-            request.auth_info.provider = self._auth_provider.provider
-            request.auth_info.token.contents = await self._auth_provider.get_access_token()
+            # generate sub requests before SignalLog generation
+            request = self._build_sub_requests(request, subrequests, subplatforms)
+
+            # the constant fields are serialized once per state in
+            # RpcState.signal_template, only the readings are built here; those
+            # that don't need the token are built while the login is running
+            sig = SignalLog()
+            loc = sig.location_updates.add()
+            sen = sig.sensor_updates.add()
 
-            # 59: 50%, others: 5% each
-            request.auth_info.token.unknown2 = choose_weighted(
-                (4, 19, 22, 26, 30, 44, 45, 50, 57, 58, 59),
-                (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 20))
-            # Sig uses this when no auth_ticket available
-            ticket_serialized = request.auth_info.SerializeToString()
+            loc.name = 'fused'
+            loc.latitude = request.latitude
+            loc.longitude = request.longitude
 
-        sig = SignalLog()
+            loc.altitude = altitude or uniform(150, 250)
 
-        sig.field22 = self.state.session_hash
+            if random() > .85:
+                # no reading for roughly 1 in 7 updates
+                loc.device_course = -1
+                loc.device_speed = -1
+            else:
+                loc.device_course = self.state.course
+                loc.device_speed = triangular(0.25, 9.7, 8.2)
+
+            loc.provider_status = 3
+            loc.location_type = 1
+            if isinstance(request.accuracy, float):
+                loc.horizontal_accuracy = choose_weighted(
+                    (request.accuracy, 65, 200), (50, 90, 100))
+                loc.vertical_accuracy = choose_weighted(
+                    (-1, 10, 12, 16, 24, 32, 48, 96),
+                    (50, 84, 89, 92, 96, 98, 99, 100))
+            else:
+                loc.horizontal_accuracy = request.accuracy
+                if request.accuracy >= 10:
+                    loc.vertical_accuracy = choose_weighted(
+                        (6, 8, 10, 12, 16, 24, 32, 48),
+                        (4, 38, 73, 84, 88, 96, 99, 100))
+                else:
+                    loc.vertical_accuracy = choose_weighted(
+                        (3, 4, 6, 8, 10, 12),
+                        (15, 54, 68, 81, 95, 100))
+
+            if loc.vertical_accuracy == -1:
+                loc.vertical_accuracy = uniform(10, 96)
+
+            sen.acceleration_x = triangular(-1.5, 2.5, 0)
+            sen.acceleration_y = triangular(-1.2, 1.4, 0)
+            sen.acceleration_z = triangular(-1.4, .9, 0)
+            sen.magnetic_field_accuracy = choose_weighted(
+                (-1, 0, 1, 2),
+                (8, 10, 52, 100))
+            if sen.magnetic_field_accuracy == -1:
+                sen.magnetic_field_x = 0
+                sen.magnetic_field_y = 0
+                sen.magnetic_field_z = 0
+            else:
+                sen.magnetic_field_x = self.state.magnetic_field_x
+                sen.magnetic_field_y = self.state.magnetic_field_y
+                sen.magnetic_field_z = self.state.magnetic_field_z
+
+            sen.attitude_pitch = triangular(-1.56, 1.57, 0.475)
+            sen.attitude_yaw = triangular(-1.56, 3.14, .1)
+            sen.attitude_roll = triangular(-3.14, 3.14, 0)
+            sen.rotation_rate_x = triangular(-3.2, 3.52, 0)
+            sen.rotation_rate_y = triangular(-3.1, 4.88, 0)
+            sen.rotation_rate_z = triangular(-6, 3.7, 0)
+            sen.gravity_x = triangular(-1, 1, 0.01)
+            sen.gravity_y = triangular(-1, 1, -.4)
+            sen.gravity_z = triangular(-1, 1, -.4)
+            sen.status = 3
+
+            if token is None:
+                self.log.debug(
+                    'Found Session Ticket - using this instead of oauth token')
+                request.auth_ticket.expire_timestamp_ms, request.auth_ticket.start, request.auth_ticket.end = self._auth_provider.get_ticket()
+                ticket_serialized = request.auth_ticket.SerializeToString()
+            else:
+                self.log.debug(
+                    'No Session Ticket found - using OAUTH Access Token')
+                request.auth_info.provider = self._auth_provider.provider
+                auth_start = monotonic()
+                request.auth_info.token.contents = await token
+                timings['auth_wait'] = monotonic() - auth_start
+
+                # 59: 50%, others: 5% each
+                request.auth_info.token.unknown2 = choose_weighted(
+                    (4, 19, 22, 26, 30, 44, 45, 50, 57, 58, 59),
+                    (1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 20))
+                # Sig uses this when no auth_ticket available
+                ticket_serialized = request.auth_info.SerializeToString()
+        finally:
+            if token is not None and not token.done():
+                token.cancel()
+
+        # the timestamps are taken once the token is in
         sig.epoch_timestamp_ms = get_time_ms()
         if not self.state.start_time:
             self.state.start_time = sig.epoch_timestamp_ms - randint(6000, 10000)
         sig.timestamp_ms_since_start = sig.epoch_timestamp_ms - self.state.start_time
 
-        hash_engine = HashServer()
-        hashing = HashServer.loop.create_task(
+        hash_engine = self.hash_backend or HashServer()
+        hash_start = monotonic()
+        hashing = loop.create_task(
             hash_engine.hash(
                 sig.epoch_timestamp_ms,
                 request.latitude,
                 request.longitude,
                 request.accuracy,
                 ticket_serialized,
-                sig.field22,
+                self.state.session_hash,
                 request.requests))
 
-        loc = sig.location_updates.add()
-        sen = sig.sensor_updates.add()
-
         sen.timestamp = sig.timestamp_ms_since_start - triangular_int(93, 4900, 3000)
         loc.timestamp_ms = sig.timestamp_ms_since_start - triangular_int(320, 3000, 1000)
 
-        loc.name = 'fused'
-        loc.latitude = request.latitude
-        loc.longitude = request.longitude
-
-        loc.altitude = altitude or uniform(150, 250)
-
-        if random() > .85:
-            # no reading for roughly 1 in 7 updates
-            loc.device_course = -1
-            loc.device_speed = -1
-        else:
-            loc.device_course = self.state.course
-            loc.device_speed = triangular(0.25, 9.7, 8.2)
-
-        loc.provider_status = 3
-        loc.location_type = 1
-        if isinstance(request.accuracy, float):
-            loc.horizontal_accuracy = choose_weighted(
-                (request.accuracy, 65, 200), (50, 90, 100))
-            loc.vertical_accuracy = choose_weighted(
-                (-1, 10, 12, 16, 24, 32, 48, 96),
-                (50, 84, 89, 92, 96, 98, 99, 100))
-        else:
-            loc.horizontal_accuracy = request.accuracy
-            if request.accuracy >= 10:
-                loc.vertical_accuracy = choose_weighted(
-                    (6, 8, 10, 12, 16, 24, 32, 48),
-                    (4, 38, 73, 84, 88, 96, 99, 100))
-            else:
-                loc.vertical_accuracy = choose_weighted(
-                    (3, 4, 6, 8, 10, 12),
-                    (15, 54, 68, 81, 95, 100))
-
-        if loc.vertical_accuracy == -1:
-            loc.vertical_accuracy = uniform(10, 96)
-
-        sen.acceleration_x = triangular(-1.5, 2.5, 0)
-        sen.acceleration_y = triangular(-1.2, 1.4, 0)
-        sen.acceleration_z = triangular(-1.4, .9, 0)
-        sen.magnetic_field_accuracy = choose_weighted(
-            (-1, 0, 1, 2),
-            (8, 10, 52, 100))
-        if sen.magnetic_field_accuracy == -1:
-            sen.magnetic_field_x = 0
-            sen.magnetic_field_y = 0
-            sen.magnetic_field_z = 0
-        else:
-            sen.magnetic_field_x = self.state.magnetic_field_x
-            sen.magnetic_field_y = self.state.magnetic_field_y
-            sen.magnetic_field_z = self.state.magnetic_field_z
-
-        sen.attitude_pitch = triangular(-1.56, 1.57, 0.475)
-        sen.attitude_yaw = triangular(-1.56, 3.14, .1)
-        sen.attitude_roll = triangular(-3.14, 3.14, 0)
-        sen.rotation_rate_x = triangular(-3.2, 3.52, 0)
-        sen.rotation_rate_y = triangular(-3.1, 4.88, 0)
-        sen.rotation_rate_z = triangular(-6, 3.7, 0)
-        sen.gravity_x = triangular(-1, 1, 0.01)
-        sen.gravity_y = triangular(-1, 1, -.4)
-        sen.gravity_z = triangular(-1, 1, -.4)
-        sen.status = 3
-
-        sig.version_hash = -782790124105039914
-
-        try:
-            for key, value in device_info.items():
-                setattr(sig.device_info, key, value)
-        except AttributeError:
-            pass
-        sig.ios_device_info.bool5 = True
-
         try:
             rtype = request.requests[0].request_type
         except (IndexError, AttributeError):
@@ -248,11 +292,16 @@ class RpcApi:
                 plat.type = 8
                 plat.request_message = plat8.SerializeToString()
 
+        hash_wait = monotonic()
         sig.location_hash, sig.location_hash_by_token_seed, rh = await hashing
+        hash_end = monotonic()
+        timings['hash'] = hash_end - hash_start
+        timings['hash_wait'] = hash_end - hash_wait
         sig.request_hashes.extend(rh)
         sig_request = SendEncryptedSignatureRequest()
-        sig_request.encrypted_signature = pycrypt(
-            sig.SerializeToString(), sig.timestamp_ms_since_start)
+        signal = merge_fields(sig.SerializeToString(), self.state.signal_template(device_info))
+        sig_request.encrypted_signature = await self._offload(
+            len(signal), pycrypt, signal, sig.timestamp_ms_since_start)
 
         plat = request.platform_requests.add()
         plat.type = 6
@@ -263,7 +312,7 @@ class RpcApi:
         self.log.debug('Generated protobuf request: \n\r%s', request)
         return request
 
-    def _build_sub_requests(self, mainrequest, subrequest_list, subplatform_list):
+    def _build_sub_requests(self, mainrequest, subrequest_list, subplatform_list, _requests=REQUESTS, _platform_requests=PLATFORM_REQUESTS, _builders=BUILDERS):
         self.log.debug('Generating sub RPC requests...')
 
         for entry in subrequest_list:
@@ -273,22 +322,24 @@ class RpcApi:
             else:
                 entry_id, entry_content = entry
 
-                proto_name = RequestType.Name(entry_id).lower() + '_message'
-
-                try:
-                    class_ = globals()[proto_name]
-                except KeyError:
-                    globals()[proto_name] = class_ = getattr(
-                        import_module(
-                            'pogoprotos.networking.requests.messages.' +
-                            proto_name +
-                            '_pb2'),
-                        to_camel_case(proto_name))
-
-                message = self._create_message(entry_content, class_())
                 subrequest = mainrequest.requests.add()
                 subrequest.request_type = entry_id
-                subrequest.request_message = message.SerializeToString()
+                if isinstance(entry_content, bytes):
+                    # already serialized, e.g. the constant parts of a bundle
+                    subrequest.request_message = entry_content
+                else:
+                    builder = _builders.get(entry_id)
+                    message = None
+                    if builder is not None:
+                        try:
+                            message = builder(**entry_content)
+                        except (TypeError, ValueError):
+                            # arguments it can't take or values of the wrong
+                            # type: the generic path logs and skips them
+                            pass
+                    if message is None:
+                        message = self._create_message(entry_content, _requests[entry_id][0]())
+                    subrequest.request_message = message.SerializeToString()
 
         for entry in subplatform_list:
             if isinstance(entry, int):
@@ -297,71 +348,79 @@ class RpcApi:
             else:
                 entry_id, entry_content = entry
 
-                proto_name = PlatformRequestType.Name(entry_id).lower() + '_request'
-
-                try:
-                    class_ = globals()[proto_name]
-                except KeyError:
-                    globals()[proto_name] = class_ = getattr(
-                        import_module(
-                            'pogoprotos.networking.paltform.requests.' +
-                            proto_name +
-                            '_pb2'),
-                        to_camel_case(proto_name))
-
-                message = self._create_message(entry_content, class_())
-                subplatform = mainrequest.requests.add()
+                subplatform = mainrequest.platform_requests.add()
                 subplatform.type = entry_id
-                subplatform.request_message = message.SerializeToString()
+                if isinstance(entry_content, bytes):
+                    subplatform.request_message = entry_content
+                else:
+                    message = self._create_message(entry_content, _platform_requests[entry_id][0]())
+                    subplatform.request_message = message.SerializeToString()
 
         return mainrequest
 
-    def _create_message(self, entry_content, message):
+    @classmethod
+    def _create_message(cls, entry_content, message):
         for key, value in entry_content.items():
             if isinstance(value, (list, tuple, array)):
-                self.log.debug(
+                cls.log.debug(
                     "Found sequence: %s - trying as repeated", key)
                 try:
                     r = getattr(message, key)
                     r.extend(value)
                 except (AttributeError, ValueError) as e:
-                    self.log.warning('Unknown argument %s inside %s (Exception: %s)', key, proto_name, e)
+                    cls.log.warning('Unknown argument %s inside %s (Exception: %s)', key, message.DESCRIPTOR.name, e)
             elif isinstance(value, dict):
                 r = getattr(message, key)
                 for k, v in value.items():
                     try:
                         setattr(r, k, v)
                     except (AttributeError, ValueError) as e:
-                        self.log.warning('Argument %s with value %s unknown inside %s (Exception: %s)', key, str(value), proto_name, e)
+                        cls.log.warning('Argument %s with value %s unknown inside %s (Exception: %s)', key, str(value), message.DESCRIPTOR.name, e)
             else:
                 try:
                     setattr(message, key, value)
                 except (AttributeError, ValueError) as e:
-                    self.log.warning('Argument %s with value %s inside %s should be a sequence.', key, value, proto_name)
+                    cls.log.warning('Argument %s with value %s inside %s should be a sequence.', key, value, message.DESCRIPTOR.name)
                     try:
-                        self.log.debug("%s -> %s", key, value)
+                        cls.log.debug("%s -> %s", key, value)
                         getattr(message, key).append(value)
                     except (AttributeError, ValueError) as e:
-                        self.log.warning('Argument %s with value %s unknown inside %s (Exception: %s)', key, value, proto_name, e)
+                        cls.log.warning('Argument %s with value %s unknown inside %s (Exception: %s)', key, value, message.DESCRIPTOR.name, e)
         return message
 
-    def _parse_response(self, response_raw, subrequests, subplatforms):
+    async def _parse_response(self, response_raw, subrequests, subplatforms, split=None):
         self.log.debug('Parsing main RPC response...')
 
-        response_proto = ResponseEnvelope()
+        # only the header fields are read until the status is known to be
+        # successful, so error responses skip decoding the returns
         try:
-            response_proto.ParseFromString(response_raw)
+            status_code, api_url = read_envelope_status(response_raw)
         except DecodeError as e:
             raise MalformedNianticResponseException(
                 'Could not parse response.') from e
 
-        self.log.debug(
-            'Protobuf structure of rpc response:\n\r%s',
-            response_proto)
-
-        # some response validations
-        status_code = response_proto.status_code
         if status_code in (1, 2):
+            executor = self.executor
+            threshold = self.offload_threshold
+            try:
+                # a thread pool takes the messages as they are, a process
+                # pool would pickle them on the loop
+                if (isinstance(executor, ThreadPoolExecutor) and
+                        len(response_raw) >= threshold):
+                    response_proto, responses = await HashServer.loop.run_in_executor(
+                        executor, self._decode, response_raw, subrequests,
+                        subplatforms, split, threshold)
+                else:
+                    response_proto, responses = self._decode(
+                        response_raw, subrequests, subplatforms, split)
+            except DecodeError as e:
+                raise MalformedNianticResponseException(
+                    'Could not parse response.') from e
+
+            self.log.debug(
+                'Protobuf structure of rpc response:\n\r%s',
+                response_proto)
+
             if response_proto.HasField('auth_ticket'):
                 self._auth_provider.set_ticket(response_proto.auth_ticket)
 
@@ -372,9 +431,9 @@ class RpcApi:
                         resp.ParseFromString(plat_response.response)
                         self.state.message8 = resp.message
                         break
-            return self._parse_sub_responses(subrequests, subplatforms, response_proto)
+            return responses
         elif status_code == 53:
-            raise ServerApiEndpointRedirectException(response_proto.api_url)
+            raise ServerApiEndpointRedirectException(api_url)
         elif status_code == 102:
             raise AuthTokenExpiredException
         elif status_code == 3:
@@ -389,55 +448,52 @@ class RpcApi:
             req_type = self.get_request_name(subrequests)
             raise InvalidRPCException("{} on {}.".format(err, req_type))
 
-    def _parse_sub_responses(self, subrequests_list, subplatforms_list, response_proto):
-        self.log.debug('Parsing sub RPC responses...')
-        responses = {}
-
-        for i, subresponse in enumerate(response_proto.returns):
-            request_entry = subrequests_list[i]
-
-            entry_name = RequestType.Name(
-                request_entry if isinstance(
-                    request_entry, int) else request_entry[0])
-            proto_name = entry_name.lower() + '_response'
-
-            try:
-                class_ = globals()[proto_name]
-            except KeyError:
-                globals()[proto_name] = class_ = getattr(
-                    import_module(
-                        'pogoprotos.networking.responses.' +
-                        proto_name +
-                        '_pb2'),
-                    to_camel_case(proto_name))
-
-            message = class_()
-            message.ParseFromString(subresponse)
-            responses[entry_name] = message
-
-        for i, subresponse in enumerate(response_proto.platform_returns):
-            request_entry = subresponse.type
-
-            entry_name = PlatformRequestType.Name(
-                request_entry if isinstance(
-                    request_entry, int) else request_entry[0])
-            proto_name = entry_name.lower() + '_response'
-
-            try:
-                class_ = globals()[proto_name]
-            except KeyError:
-                globals()[proto_name] = class_ = getattr(
-                    import_module(
-                        'pogoprotos.networking.platform.responses.' +
-                        proto_name +
-                        '_pb2'),
-                    to_camel_case(proto_name))
-
-            message = class_()
-            message.ParseFromString(subresponse.response)
-            responses[entry_name] = message
+    def _decode(self, response_raw, subrequests, subplatforms, split=None, threshold=None):
+        """Parse the envelope and map its returns to their request names.
 
-        return responses
+        With a threshold, returns of at least that many bytes are decoded
+        right away instead of on first access.
+        """
+        response_proto = ResponseEnvelope()
+        response_proto.ParseFromString(response_raw)
+        responses = self._parse_sub_responses(subrequests, subplatforms, response_proto, split)
+        if threshold is not None:
+            for group in (responses if split else (responses,)):
+                group.decode(threshold)
+        return response_proto, responses
+
+    def _parse_sub_responses(self, subrequests_list, subplatforms_list, response_proto, split=None, _requests=REQUESTS, _platform_requests=PLATFORM_REQUESTS):
+        """Map the returns of the envelope to their request names.
+
+        If split is a sequence of group sizes, the returns are divided into
+        consecutive groups of that many sub-requests and a list with one
+        mapping per group is returned; platform returns go in every group.
+        """
+        self.log.debug('Parsing sub RPC responses...')
+        request_names = _requests.names
+        platform_names = _platform_requests.names
+        returns = response_proto.returns
+        groups = []
+        start = 0
+
+        for size in split or (len(subrequests_list),):
+            responses = LazyResponses()
+            end = start + size
+            for request_entry, subresponse in zip(subrequests_list[start:end], returns[start:end]):
+                if not isinstance(request_entry, int):
+                    request_entry = request_entry[0]
+                responses.add(request_names[request_entry],
+                              _requests[request_entry][1],
+                              subresponse)
+
+            for subresponse in response_proto.platform_returns:
+                responses.add(platform_names[subresponse.type],
+                              _platform_requests[subresponse.type][1],
+                              subresponse.response)
+            groups.append(responses)
+            start = end
+
+        return groups if split else groups[0]
 
 
 class RpcState:
@@ -453,6 +509,40 @@ class RpcState:
         self.mag_z_max = self.mag_y_min + 15
         self._course = uniform(0, 359.99)
         self.message8 = None
+        self._signal_template = None
+        self._template_key = None
+
+    def signal_template(self, device_info=None):
+        """Serialized SignalLog fields that never change for this state.
+
+        Returns (field number, encoding) pairs for wire.merge_fields(),
+        which puts them between each request's serialized readings in
+        field number order. The template is rebuilt whenever device_info
+        holds different values.
+        """
+        try:
+            key = tuple(device_info.items())
+        except AttributeError:
+            key = None
+        if self._signal_template is None or key != self._template_key:
+            sig = SignalLog()
+            try:
+                for name, value in key:
+                    setattr(sig.device_info, name, value)
+            except (AttributeError, TypeError):
+                pass
+            sig.ios_device_info.bool5 = True
+            # device_info and ios_device_info are fields 8 and 9
+            template = [(8, sig.SerializeToString())]
+            sig = SignalLog()
+            sig.field22 = self.session_hash
+            template.append((22, sig.SerializeToString()))
+            sig = SignalLog()
+            sig.version_hash = -782790124105039914
+            template.append((25, sig.SerializeToString()))
+            self._signal_template = template
+            self._template_key = key
+        return self._signal_template
 
     @property
     def request_id(self):
@@ -0,0 +1,223 @@
+from array import array
+from functools import lru_cache
+from math import asin, atan2, ceil, cos, degrees, floor, pi, radians, sin, sqrt
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+EARTH_RADIUS = 6371010.0
+MAX_LEVEL = 30
+MAX_SIZE = 1 << MAX_LEVEL
+# S2 minimum cell width metric for the quadratic projection
+MIN_WIDTH_DERIV = 2 * sqrt(2) / 3
+
+_LOOKUP_BITS = 4
+_SWAP = 1
+_INVERT = 2
+_POS_TO_IJ = ((0, 1, 3, 2), (0, 2, 3, 1), (3, 2, 0, 1), (3, 1, 0, 2))
+_POS_TO_ORIENTATION = (_SWAP, 0, 0, _INVERT | _SWAP)
+_LOOKUP_POS = [0] * (1 << (2 * _LOOKUP_BITS + 2))
+
+
+def _init_lookup(level, i, j, orig_orientation, pos, orientation):
+    if level == _LOOKUP_BITS:
+        ij = (i << _LOOKUP_BITS) + j
+        _LOOKUP_POS[(ij << 2) + orig_orientation] = (pos << 2) + orientation
+        return
+    level += 1
+    i <<= 1
+    j <<= 1
+    pos <<= 2
+    r = _POS_TO_IJ[orientation]
+    for index in range(4):
+        _init_lookup(level, i + (r[index] >> 1), j + (r[index] & 1),
+                     orig_orientation, pos + index,
+                     orientation ^ _POS_TO_ORIENTATION[index])
+
+
+for _orientation in (0, _SWAP, _INVERT, _SWAP | _INVERT):
+    _init_lookup(0, 0, 0, _orientation, 0, _orientation)
+del _orientation
+
+
+def _uv_to_st(u):
+    if u >= 0:
+        return 0.5 * sqrt(1 + 3 * u)
+    return 1 - 0.5 * sqrt(1 - 3 * u)
+
+
+def _st_to_ij(s):
+    return max(0, min(MAX_SIZE - 1, int(floor(MAX_SIZE * s))))
+
+
+def _xyz_to_face_uv(x, y, z):
+    ax, ay, az = abs(x), abs(y), abs(z)
+    if ax >= ay and ax >= az:
+        return (0, y / x, z / x) if x > 0 else (3, z / x, y / x)
+    if ay >= az:
+        return (1, -x / y, z / y) if y > 0 else (4, z / y, -x / y)
+    return (2, -x / z, -y / z) if z > 0 else (5, -y / z, -x / z)
+
+
+def _face_ij_to_id(face, i, j, level):
+    n = face << 60
+    bits = face & _SWAP
+    mask = (1 << _LOOKUP_BITS) - 1
+    for k in range(7, -1, -1):
+        bits += ((i >> (k * _LOOKUP_BITS)) & mask) << (_LOOKUP_BITS + 2)
+        bits += ((j >> (k * _LOOKUP_BITS)) & mask) << 2
+        bits = _LOOKUP_POS[bits]
+        n |= (bits >> 2) << (k * 2 * _LOOKUP_BITS)
+        bits &= _SWAP | _INVERT
+    lsb = 1 << (2 * (MAX_LEVEL - level))
+    return (((n << 1) + 1) & -lsb | lsb) & 0xffffffffffffffff
+
+
+def cell_id(latitude, longitude, level=15):
+    '''Return the id of the S2 cell at level that contains a point.'''
+    lat = radians(latitude)
+    lng = radians(longitude)
+    cos_lat = cos(lat)
+    face, u, v = _xyz_to_face_uv(cos_lat * cos(lng), cos_lat * sin(lng), sin(lat))
+    return _face_ij_to_id(face, _st_to_ij(_uv_to_st(u)),
+                          _st_to_ij(_uv_to_st(v)), level)
+
+
+if np is None:
+    def cell_ids(latitudes, longitudes, level=15):
+        '''Return the level cell ids of many points as an array('Q').'''
+        return array('Q', (cell_id(lat, lon, level)
+                           for lat, lon in zip(latitudes, longitudes)))
+else:
+    _NP_LOOKUP_POS = np.array(_LOOKUP_POS, dtype=np.int64)
+
+    def _np_uv_to_st(u):
+        return np.where(u >= 0, 0.5 * np.sqrt(1 + 3 * np.abs(u)),
+                        1 - 0.5 * np.sqrt(1 + 3 * np.abs(u)))
+
+    def _np_st_to_ij(s):
+        return np.clip(np.floor(MAX_SIZE * s), 0, MAX_SIZE - 1).astype(np.int64)
+
+    def cell_ids(latitudes, longitudes, level=15):
+        '''Return the level cell ids of many points as an array('Q').
+
+        The conversion is vectorized with NumPy; latitudes and longitudes
+        may be any sequences or arrays of equal length.
+        '''
+        lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+        lng = np.radians(np.asarray(longitudes, dtype=np.float64))
+        cos_lat = np.cos(lat)
+        xyz = np.stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)))
+        x, y, z = xyz
+        axis = np.argmax(np.abs(xyz), axis=0)
+        negative = xyz[axis, np.arange(axis.size)] < 0
+        face = axis + 3 * negative
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            u = np.choose(face, (y / x, -x / y, -x / z, z / x, z / y, -y / z))
+            v = np.choose(face, (z / x, z / y, -y / z, y / x, -x / y, -x / z))
+        i = _np_st_to_ij(_np_uv_to_st(u))
+        j = _np_st_to_ij(_np_uv_to_st(v))
+
+        n = face.astype(np.uint64) << np.uint64(60)
+        bits = face & _SWAP
+        mask = (1 << _LOOKUP_BITS) - 1
+        for k in range(7, -1, -1):
+            bits = bits + (((i >> (k * _LOOKUP_BITS)) & mask) << (_LOOKUP_BITS + 2))
+            bits = bits + (((j >> (k * _LOOKUP_BITS)) & mask) << 2)
+            bits = _NP_LOOKUP_POS[bits]
+            n |= (bits >> 2).astype(np.uint64) << np.uint64(k * 2 * _LOOKUP_BITS)
+            bits = bits & (_SWAP | _INVERT)
+        lsb = np.uint64(1 << (2 * (MAX_LEVEL - level)))
+        ids = (n << np.uint64(1)) + np.uint64(1)
+        ids = (ids & ~(lsb - np.uint64(1))) | lsb
+        return array('Q', ids.tobytes())
+
+
+def min_cell_width(level=15):
+    '''Smallest edge-to-edge width in meters of any cell at level.'''
+    return MIN_WIDTH_DERIV / (1 << level) * EARTH_RADIUS
+
+
+def _offsets(radius, spacing):
+    '''Meter offsets of a grid with spacing inside the circle of radius,
+    plus points along the circle so cells crossing the edge are included.
+    The circle is sampled 16 times as densely as the grid because cells
+    that only clip it with a corner are narrow there.
+    '''
+    steps = int(ceil(radius / spacing))
+    offsets = [(dx * spacing, dy * spacing)
+               for dx in range(-steps, steps + 1)
+               for dy in range(-steps, steps + 1)
+               if (dx * dx + dy * dy) * spacing * spacing <= radius * radius]
+    ring = max(8, int(ceil(32 * pi * radius / spacing)))
+    offsets.extend((radius * cos(2 * pi * k / ring), radius * sin(2 * pi * k / ring))
+                   for k in range(ring))
+    return offsets
+
+
+def _destinations(latitude, longitude, offsets):
+    lat = radians(latitude)
+    lng = radians(longitude)
+    points = []
+    for north, east in offsets:
+        distance = sqrt(north * north + east * east) / EARTH_RADIUS
+        bearing = atan2(east, north)
+        lat2 = asin(sin(lat) * cos(distance) +
+                    cos(lat) * sin(distance) * cos(bearing))
+        lng2 = lng + atan2(sin(bearing) * sin(distance) * cos(lat),
+                           cos(distance) - sin(lat) * sin(lat2))
+        points.append((degrees(lat2), (degrees(lng2) + 540) % 360 - 180))
+    return points
+
+
+@lru_cache(maxsize=4096)
+def _covering(latitude, longitude, radius, level):
+    offsets = _offsets(radius, min_cell_width(level) / 2)
+    points = _destinations(latitude, longitude, offsets)
+    ids = cell_ids([p[0] for p in points], [p[1] for p in points], level)
+    return array('Q', sorted(set(ids))).tobytes()
+
+
+def get_cell_ids(latitude, longitude, radius=500, level=15, precision=5):
+    '''Return the sorted ids of the level cells within radius meters of a
+    point as an array('Q'), ready for GetMapObjectsMessage.cell_id.
+
+    The disc is sampled at half the minimum cell width, so only cells that
+    clip its edge by a corner of a few meters can be missed. Results are
+    cached on the coordinates rounded to precision decimal places.
+    '''
+    ids = array('Q')
+    ids.frombytes(_covering(round(latitude, precision),
+                            round(longitude, precision), radius, level))
+    return ids
+
+
+def covering_cell_ids(points, radius=500, level=15):
+    '''Return the sorted union of the cells within radius meters of any of
+    many (latitude, longitude) points as an array('Q').
+
+    With NumPy the sampling is vectorized over all points at once.
+    '''
+    if np is None:
+        ids = set()
+        for latitude, longitude in points:
+            ids.update(get_cell_ids(latitude, longitude, radius, level))
+        return array('Q', sorted(ids))
+
+    offsets = _offsets(radius, min_cell_width(level) / 2)
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lat = np.radians(points[:, 0])[:, None]
+    lng = np.radians(points[:, 1])[:, None]
+    offsets = np.asarray(offsets, dtype=np.float64)
+    distance = np.hypot(offsets[:, 0], offsets[:, 1]) / EARTH_RADIUS
+    bearing = np.arctan2(offsets[:, 1], offsets[:, 0])
+    lat2 = np.arcsin(np.sin(lat) * np.cos(distance) +
+                     np.cos(lat) * np.sin(distance) * np.cos(bearing))
+    lng2 = lng + np.arctan2(np.sin(bearing) * np.sin(distance) * np.cos(lat),
+                            np.cos(distance) - np.sin(lat) * np.sin(lat2))
+    ids = cell_ids(np.degrees(lat2).ravel(),
+                   (np.degrees(lng2).ravel() + 540) % 360 - 180, level)
+    return array('Q', np.unique(np.frombuffer(ids, dtype=np.uint64)).tobytes())
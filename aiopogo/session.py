@@ -1,71 +1,223 @@
-from asyncio import get_event_loop
+from asyncio import ensure_future, gather, get_event_loop
+from collections import OrderedDict
+from inspect import isawaitable
+from time import monotonic
+
+from aiohttp import ClientSession, ClientRequest
+
+try:
+    from aiohttp import TraceConfig
+except ImportError:
+    TraceConfig = None
+
+from .connector import TrackingConnector, TrackingMixin
+from .resolver import DNS_CACHE
+from .tls import SSL_CONTEXT, connector_ssl, create_context
+
+
+class ConnectionStats:
+    '''Connection reuse of one pool: connects counts every connection
+    handed out, handshakes the new ones among them.'''
+    __slots__ = ('connects', 'handshakes', 'handshake_time')
+
+    def __init__(self):
+        self.connects = 0
+        self.handshakes = 0
+        self.handshake_time = 0.0
+
+    @property
+    def reuse_rate(self):
+        if not self.connects:
+            return 0.0
+        return (self.connects - self.handshakes) / self.connects
+
+    def as_dict(self):
+        return {'connects': self.connects, 'handshakes': self.handshakes,
+                'reuse_rate': self.reuse_rate,
+                'handshake_time': (self.handshake_time / self.handshakes
+                                   if self.handshakes else None)}
+
+
+def _trace_configs(stats):
+    '''Count the connections of a session in stats through aiohttp's
+    tracing hooks; aiohttp 2 has none, its sessions aren't counted.'''
+    if TraceConfig is None:
+        return {}
+
+    async def on_create_start(session, context, params):
+        context.connect_start = monotonic()
+
+    async def on_create_end(session, context, params):
+        stats.connects += 1
+        stats.handshakes += 1
+        stats.handshake_time += monotonic() - context.connect_start
+
+    async def on_reuse(session, context, params):
+        stats.connects += 1
+
+    config = TraceConfig()
+    config.on_connection_create_start.append(on_create_start)
+    config.on_connection_create_end.append(on_create_end)
+    config.on_connection_reuseconn.append(on_reuse)
+    return {'trace_configs': [config]}
 
-from aiohttp import ClientSession, ClientRequest, TCPConnector
 
 try:
     from aiosocks.connector import ProxyClientRequest, ProxyConnector
+
+    class TrackingProxyConnector(TrackingMixin, ProxyConnector):
+        pass
 except ImportError:
     class ProxyConnector:
         def __init__(self, *args, **kwargs):
             raise ImportError('Install aiosocks to use socks proxies.')
-    ProxyClientRequest = ProxyConnector
+    ProxyClientRequest = TrackingProxyConnector = ProxyConnector
+
+
+def close_session(session):
+    '''Close a ClientSession; with aiohttp 3 closing is a coroutine, it is
+    scheduled and the future returned.'''
+    closing = session.close()
+    if isawaitable(closing):
+        return ensure_future(closing)
+    return None
 
 
 class SessionManager:
+    '''Hands out a ClientSession per proxy, each with its own connection
+    pool of at most limit_per_proxy connections, so busy proxies can't
+    starve the others. Requests without a proxy share one session with
+    up to limit connections.
+
+    At most max_sessions proxy sessions are kept open; beyond that the
+    least recently used ones are closed, except those held: hold() and
+    release() bracket every use of a session. stats() reports how well
+    each open pool reuses its connections, evictions counts the closed
+    ones. All pools look up hosts through the shared DNS_CACHE.
+
+    TLS sessions are resumed per proxy: every proxy session gets its own
+    ResumingContext, so a session ticket never shows up through two exit
+    IPs and links the accounts behind them. Direct connections use
+    SSL_CONTEXT, shared with the hashing and RpcTransport connections
+    that leave from the same IP. The price is a full handshake on the
+    first connection through every proxy, and again after an eviction.
+    '''
     __slots__ = (
         'loop',
-        'session',
-        'connector',
-        'socks_session',
-        'socks_connector')
+        'limit',
+        'limit_per_proxy',
+        'max_sessions',
+        'sessions',
+        'users',
+        'connection_stats',
+        'contexts',
+        'evictions')
 
-    def __init__(self):
+    def __init__(self, limit=400, limit_per_proxy=20, max_sessions=256):
         self.loop = get_event_loop()
+        self.limit = limit
+        self.limit_per_proxy = limit_per_proxy
+        self.max_sessions = max_sessions
+        # keyed by proxy URL string, None for direct connections
+        self.sessions = OrderedDict()
+        # number of holders of every session in use
+        self.users = {}
+        self.connection_stats = {}
+        # the TLS context of every proxy session
+        self.contexts = {}
+        self.evictions = 0
 
     def get(self, proxy=None):
-        socks = proxy and proxy.scheme in ('socks4', 'socks5')
-        try:
-            return self.socks_session if socks else self.session
-        except AttributeError:
-            session = ClientSession(connector=self.get_connector(socks),
-                                    loop=self.loop,
-                                    headers=(
-                                        ('Content-Type', 'application/binary'),
-                                        ('User-Agent', 'Niantic App'),
-                                        ('Accept-Encoding', 'identity, gzip')),
-                                    request_class=ProxyClientRequest if socks else ClientRequest,
-                                    raise_for_status=True,
-                                    conn_timeout=10.0)
-            if socks:
-                self.socks_session = session
-            else:
-                self.session = session
-            return session
-
-    def get_connector(self, socks, limit=400):
+        key = None if proxy is None else str(proxy)
         try:
-            return self.socks_connector if socks else self.connector
-        except AttributeError:
-            if socks:
-                self.socks_connector = ProxyConnector(limit=limit,
-                                                      loop=self.loop,
-                                                      verify_ssl=False)
-                return self.socks_connector
-
-            self.connector = TCPConnector(limit=limit,
-                                          loop=self.loop,
-                                          verify_ssl=False)
-            return self.connector
+            session = self.sessions[key]
+        except KeyError:
+            session = self._create(key, proxy)
+            self.sessions[key] = session
+            if key is not None:
+                self._evict(key)
+        else:
+            self.sessions.move_to_end(key)
+        return session
+
+    def hold(self, proxy=None):
+        '''Return the session for proxy, which isn't evicted until it is
+        given back with release(proxy).'''
+        session = self.get(proxy)
+        key = None if proxy is None else str(proxy)
+        self.users[key] = self.users.get(key, 0) + 1
+        return session
+
+    def release(self, proxy=None):
+        key = None if proxy is None else str(proxy)
+        users = self.users.get(key, 0) - 1
+        if users > 0:
+            self.users[key] = users
+        else:
+            self.users.pop(key, None)
+
+    def in_use(self, proxy=None):
+        return self.users.get(None if proxy is None else str(proxy), 0)
+
+    def _create(self, key, proxy):
+        socks = proxy is not None and proxy.scheme in ('socks4', 'socks5')
+        stats = self.connection_stats.get(key)
+        if stats is None:
+            stats = self.connection_stats[key] = ConnectionStats()
+        if key is None:
+            context = SSL_CONTEXT
+        else:
+            context = self.contexts.get(key)
+            if context is None:
+                context = self.contexts[key] = create_context()
+        if socks:
+            connector = TrackingProxyConnector(limit=self.limit_per_proxy,
+                                               loop=self.loop,
+                                               resolver=DNS_CACHE,
+                                               **connector_ssl(context))
+        else:
+            connector = TrackingConnector(
+                limit=self.limit if key is None else self.limit_per_proxy,
+                loop=self.loop,
+                resolver=DNS_CACHE,
+                **connector_ssl(context))
+        return ClientSession(connector=connector,
+                             loop=self.loop,
+                             headers=(
+                                 ('Content-Type', 'application/binary'),
+                                 ('User-Agent', 'Niantic App'),
+                                 ('Accept-Encoding', 'identity, gzip')),
+                             request_class=ProxyClientRequest if socks else ClientRequest,
+                             conn_timeout=10.0,
+                             **_trace_configs(stats))
+
+    def _evict(self, new):
+        excess = len(self.sessions) - self.max_sessions - (None in self.sessions)
+        if excess <= 0:
+            return
+        for key, session in list(self.sessions.items()):
+            if key is None or key == new or key in self.users:
+                continue
+            del self.sessions[key]
+            self.connection_stats.pop(key, None)
+            self.contexts.pop(key, None)
+            close_session(session)
+            self.evictions += 1
+            excess -= 1
+            if not excess:
+                break
+
+    def stats(self):
+        '''Return the connection reuse of every pool, keyed by proxy.'''
+        return {key: stats.as_dict() for key, stats in self.connection_stats.items()}
 
     def close(self):
-        try:
-            self.session.close()
-        except AttributeError:
-            pass
-        try:
-            self.socks_session.close()
-        except AttributeError:
-            pass
+        closing = [close_session(session) for session in self.sessions.values()]
+        self.sessions.clear()
+        closing = [x for x in closing if x is not None]
+        if closing:
+            return gather(*closing)
+        return None
 
 
 SESSIONS = SessionManager()
@@ -0,0 +1,138 @@
+from time import time
+
+import ssl
+from ssl import CERT_NONE, SSLContext, SSLObject, SSLSocket
+
+from aiohttp import __version__ as _aiohttp_version
+
+_PROTOCOL = getattr(ssl, 'PROTOCOL_TLS_CLIENT', ssl.PROTOCOL_SSLv23)
+# SSLContext.sslobject_class and wrap_bio's session argument are 3.7+
+_RESUMPTION = hasattr(SSLContext, 'sslobject_class')
+
+
+class _SSLObject(SSLObject):
+    # True until the session of this connection is saved
+    _unsaved = True
+
+    def do_handshake(self):
+        super().do_handshake()
+        self.context._handshake_done(self)
+
+    def read(self, len=1024, buffer=None):
+        data = super().read(len, buffer)
+        if self._unsaved:
+            self.context._save(self)
+        return data
+
+
+class _SSLSocket(SSLSocket):
+    _unsaved = True
+
+    def do_handshake(self, block=False):
+        super().do_handshake(block)
+        self.context._handshake_done(self)
+
+    def read(self, len=1024, buffer=None):
+        data = super().read(len, buffer)
+        if self._unsaved:
+            self.context._save(self)
+        return data
+
+
+class ResumingContext(SSLContext):
+    '''SSLContext that resumes TLS sessions.
+
+    The last session of every host is offered again on the next
+    connection to it, so reconnects skip the certificate exchange and key
+    agreement of a full handshake. Sessions are keyed by host only, so a
+    context must not be shared by connections through different proxies:
+    a resumed session ties them together whatever their exit IP.
+    SSL_CONTEXT serves the direct connections, SESSIONS creates one per
+    proxy. status() counts full and resumed handshakes per host.
+    '''
+    sslobject_class = _SSLObject
+    sslsocket_class = _SSLSocket
+
+    def __new__(cls, protocol=_PROTOCOL):
+        return super().__new__(cls, protocol)
+
+    def __init__(self, protocol=_PROTOCOL):
+        self._sessions = {}
+        self._handshakes = {}
+
+    def wrap_bio(self, incoming, outgoing, server_side=False, server_hostname=None, session=None):
+        if not _RESUMPTION:
+            return super().wrap_bio(incoming, outgoing, server_side, server_hostname)
+        if session is None and server_hostname and not server_side:
+            session = self._session(server_hostname)
+        return super().wrap_bio(incoming, outgoing, server_side, server_hostname, session)
+
+    def wrap_socket(self, sock, server_side=False, do_handshake_on_connect=True,
+                    suppress_ragged_eofs=True, server_hostname=None, session=None):
+        if not _RESUMPTION:
+            return super().wrap_socket(sock, server_side, do_handshake_on_connect,
+                                       suppress_ragged_eofs, server_hostname)
+        if session is None and server_hostname and not server_side:
+            session = self._session(server_hostname)
+        return super().wrap_socket(sock, server_side, do_handshake_on_connect,
+                                   suppress_ragged_eofs, server_hostname, session)
+
+    def _session(self, host):
+        session = self._sessions.get(host)
+        if session is not None and session.time + session.timeout < time():
+            del self._sessions[host]
+            return None
+        return session
+
+    def _handshake_done(self, connection):
+        host = connection.server_hostname
+        counts = self._handshakes.get(host)
+        if counts is None:
+            counts = self._handshakes[host] = [0, 0]
+        counts[connection.session_reused] += 1
+        self._save(connection)
+
+    def _save(self, connection):
+        session = connection.session
+        if session is None:
+            return
+        # TLS 1.3 tickets arrive after the handshake, with the first read
+        if not session.has_ticket and connection.version() == 'TLSv1.3':
+            return
+        connection._unsaved = False
+        host = connection.server_hostname
+        if host:
+            self._sessions[host] = session
+
+    def clear(self):
+        '''Forget all sessions, the next connections do full handshakes.'''
+        self._sessions.clear()
+
+    def status(self):
+        full = sum(counts[0] for counts in self._handshakes.values())
+        resumed = sum(counts[1] for counts in self._handshakes.values())
+        return {'full': full, 'resumed': resumed,
+                'resumption_rate': resumed / (full + resumed) if full + resumed else 0.0,
+                'sessions': len(self._sessions),
+                'hosts': {host: {'full': counts[0], 'resumed': counts[1]}
+                          for host, counts in self._handshakes.items()}}
+
+
+def create_context():
+    '''Return a ResumingContext that, like verify_ssl=False, doesn't
+    verify certificates.'''
+    context = ResumingContext()
+    context.check_hostname = False
+    context.verify_mode = CERT_NONE
+    return context
+
+
+def connector_ssl(context):
+    '''Return the keyword argument that makes an aiohttp connector use
+    context; aiohttp 3 renamed ssl_context to ssl.'''
+    if int(_aiohttp_version.split('.', 1)[0]) < 3:
+        return {'ssl_context': context}
+    return {'ssl': context}
+
+
+SSL_CONTEXT = create_context()
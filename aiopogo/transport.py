@@ -0,0 +1,768 @@
+from asyncio import Protocol, Semaphore, TimeoutError, ensure_future, gather, get_event_loop, sleep, wait_for
+from collections import deque
+from socket import AF_INET
+from time import monotonic
+from zlib import MAX_WBITS, decompress
+
+from aiohttp import __version__, ClientError, ClientHttpProxyError, ClientProxyConnectionError, ClientRequest, ClientSession, ServerConnectionError, ServerTimeoutError
+from yarl import URL
+
+try:
+    from aiohttp import ClientTimeout
+except ImportError:
+    ClientTimeout = None
+
+from .connector import MaxAgeConnector, TrackingConnector, server_key
+from .exceptions import MalformedNianticResponseException, MalformedResponseException, ProxyException, SocksError
+from .resolver import DNS_CACHE
+from .session import ProxyClientRequest, SessionManager, close_session
+from .tls import SSL_CONTEXT
+
+_aiohttp_version = tuple(int(x) for x in __version__.split('.')[:2])
+
+
+class TransportError(Exception):
+    '''A request failed below HTTP, e.g. the connection was refused.'''
+
+
+class DisconnectedError(TransportError):
+    '''The connection broke off after the request was sent.'''
+
+
+class TransportResponse:
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class _Headers(dict):
+    '''Response headers with lower-case names, looked up in any case.'''
+
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name.lower())
+
+    def get(self, name, default=None):
+        return dict.get(self, name.lower(), default)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name.lower())
+
+
+class Transport:
+    '''Posts request bodies for HashServer and RpcApi.
+
+    post() returns an async context manager that yields a
+    TransportResponse, whose body is only valid inside the block. Error
+    statuses are returned like any other; timeouts raise
+    asyncio.TimeoutError, proxy failures ProxyException and other
+    connection failures TransportError.
+    '''
+
+    def post(self, url, data, headers=None, proxy=None, proxy_auth=None):
+        raise NotImplementedError
+
+    async def warmup(self, url, n, proxy=None, proxy_auth=None):
+        '''Open connections to url ahead of demand until n are idle, and
+        from then on open new ones whenever fewer than n are idle.
+
+        Returns the number of connections opened.
+        '''
+        return 0
+
+    def status(self):
+        '''Return the idle connections and their target per warmed pool.'''
+        return {}
+
+    def close(self):
+        pass
+
+
+class RpcProtocol(Protocol):
+    '''One keep-alive HTTP/1.1 connection that reads response bodies into
+    a buffer it keeps for the next response.'''
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.transport = None
+        self.created = monotonic()
+        self.buffer = bytearray(65536)
+        self.closed = False
+        self._waiter = None
+        self._reset()
+
+    def _reset(self):
+        self._head = bytearray()
+        self._status = None
+        self._headers = None
+        self._length = None
+        self._chunked = False
+        self._gzip = False
+        self._keep_alive = True
+        self._received = 0
+        self._chunks = None
+        # where parsing of the chunked body resumes
+        self._chunk_pos = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.closed = True
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(exc or ConnectionResetError('Connection closed.'))
+
+    def send(self, head, data):
+        '''Write the request and return a future for the response body.'''
+        if self.closed:
+            raise ConnectionResetError('Connection closed.')
+        self._reset()
+        self._waiter = self.loop.create_future()
+        self.transport.writelines((head, data))
+        return self._waiter
+
+    def data_received(self, data):
+        if self._status is None:
+            if self._head:
+                self._head += data
+                data = self._head
+            end = data.find(b'\r\n\r\n')
+            if end < 0:
+                if data is not self._head:
+                    self._head += data
+                return
+            self._parse_head(bytes(data[:end]))
+            # the rest is the start of the body, copied only into the buffer
+            data = memoryview(data)[end + 4:]
+            if self._length == 0:
+                self._finish()
+                return
+        if self._chunked:
+            self._chunks += data
+            self._parse_chunks()
+            return
+
+        length = self._length
+        received = self._received
+        size = len(data)
+        if length is None:
+            # no length: the body ends with the connection
+            self._chunks += data
+            return
+        memoryview(self.buffer)[received:received + size] = data
+        self._received = received + size
+        if self._received >= length:
+            self._finish()
+
+    def _parse_head(self, head):
+        lines = head.split(b'\r\n')
+        self._status = int(lines[0].split(None, 2)[1])
+        self._headers = headers = _Headers()
+        for line in lines[1:]:
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            value = value.strip()
+            headers[name.decode('latin-1')] = value.decode('latin-1')
+            value = value.lower()
+            if name == b'content-length':
+                self._length = int(value)
+            elif name == b'transfer-encoding' and b'chunked' in value:
+                self._chunked = True
+            elif name == b'content-encoding' and b'gzip' in value:
+                self._gzip = True
+            elif name == b'connection' and value == b'close':
+                self._keep_alive = False
+        if self._chunked:
+            self._length = None
+            self._chunks = bytearray()
+        elif self._length is None:
+            self._keep_alive = False
+            self._chunks = bytearray()
+        elif len(self.buffer) < self._length:
+            self.buffer = bytearray(self._length)
+
+    def _parse_chunks(self):
+        # complete chunks are copied into the buffer as they arrive, so
+        # every byte is only parsed once
+        chunks = self._chunks
+        pos = self._chunk_pos
+        while True:
+            end = chunks.find(b'\r\n', pos)
+            if end < 0:
+                break
+            size = int(bytes(chunks[pos:end]).split(b';', 1)[0], 16)
+            if size == 0:
+                self._length = self._received
+                self._finish()
+                return
+            start = end + 2
+            if len(chunks) < start + size + 2:
+                break
+            self._append(chunks[start:start + size])
+            pos = start + size + 2
+        self._chunk_pos = pos
+
+    def _append(self, data):
+        received = self._received
+        end = received + len(data)
+        if len(self.buffer) < end:
+            # a new buffer, the last body may still be viewed
+            buffer = bytearray(max(end, 2 * len(self.buffer)))
+            buffer[:received] = memoryview(self.buffer)[:received]
+            self.buffer = buffer
+        memoryview(self.buffer)[received:end] = data
+        self._received = end
+
+    def eof_received(self):
+        if self._status is not None and self._length is None and not self._chunked:
+            body = self._chunks
+            self._length = self._received = len(body)
+            if len(self.buffer) < self._length:
+                self.buffer = bytearray(self._length)
+            self.buffer[:self._length] = body
+            self._finish()
+        return False
+
+    def _finish(self):
+        waiter = self._waiter
+        self._waiter = None
+        if not self._keep_alive:
+            self.close()
+        if waiter is None or waiter.done():
+            return
+        if self._gzip:
+            body = decompress(bytes(self.buffer[:self._length]), MAX_WBITS | 16)
+        else:
+            body = memoryview(self.buffer)[:self._length]
+        waiter.set_result(TransportResponse(self._status, self._headers, body))
+
+    def close(self):
+        self.closed = True
+        if self.transport is not None:
+            self.transport.close()
+
+
+# errors inside a post() block after which the connection can't be trusted
+_BROKEN = (OSError, TransportError, MalformedResponseException, MalformedNianticResponseException)
+
+
+class _Exchange:
+    __slots__ = ('transport', 'key', 'head', 'data', 'protocol', 'complete', 'deadline')
+
+    def __init__(self, transport, key, head, data):
+        self.transport = transport
+        self.key = key
+        self.head = head
+        self.data = data
+        self.protocol = None
+        # True once the whole response is read
+        self.complete = False
+        # loop time by which the response must be in, for all stages
+        self.deadline = None
+
+    async def __aenter__(self):
+        transport = self.transport
+        if transport.timeout is not None:
+            self.deadline = transport.loop.time() + transport.timeout
+        slots = transport._slots(self.key)
+        if slots is not None:
+            await wait_for(slots.acquire(), self._remaining())
+        try:
+            return await self._send()
+        except BaseException:
+            if slots is not None:
+                slots.release()
+            raise
+
+    async def _send(self):
+        transport = self.transport
+        for attempt in range(2):
+            protocol, reused = await transport._acquire(self.key, self._remaining())
+            self.protocol = protocol
+            try:
+                response = await wait_for(protocol.send(self.head, self.data),
+                                          self._remaining())
+                self.complete = True
+                return response
+            except TimeoutError:
+                self._discard()
+                raise
+            except OSError as e:
+                self._discard()
+                if reused and attempt == 0:
+                    # the server closed the idle connection, use a new one
+                    continue
+                raise DisconnectedError(
+                    '{}: {}'.format(e.__class__.__name__, e)) from e
+
+    async def __aexit__(self, exc_type, exc, tb):
+        protocol = self.protocol
+        if protocol is not None:
+            self.protocol = None
+            # errors about the response itself, like a bad status, leave
+            # the connection ready for the next request
+            if (self.complete and not protocol.closed and
+                    (exc_type is None or not issubclass(exc_type, _BROKEN))):
+                self.transport._idle[self.key].append(protocol)
+            else:
+                protocol.close()
+        slots = self.transport._slots(self.key)
+        if slots is not None:
+            slots.release()
+
+    def _remaining(self):
+        '''Return the time left of the timeout, which the slot, connection
+        and response share.'''
+        if self.deadline is None:
+            return None
+        return max(self.deadline - self.transport.loop.time(), 0.0)
+
+    def _discard(self):
+        if self.protocol is not None:
+            self.protocol.close()
+            self.protocol = None
+
+
+class RpcTransport(Transport):
+    '''Posts over persistent connections without aiohttp.
+
+    Used by RpcApi for requests without a proxy when set with
+    PGoApi.set_transport, or by a HashServer for a plain HTTP or HTTPS
+    endpoint. The request head is built once per endpoint and written
+    together with the body, and response bodies are read into a buffer
+    owned by the connection, so the body of the TransportResponse is a
+    memoryview that is only valid inside the post() block, after which
+    the connection is reused. At most limit requests per host are in
+    flight at once, 0 or None for no limit, and connections older than
+    max_age seconds are closed instead of reused. timeout is for the
+    whole request: waiting for a slot, connecting and the response.
+    Hosts are looked up through resolver, the
+    shared DNS_CACHE by default, and TLS sessions are resumed through the
+    shared SSL_CONTEXT unless another ssl context is given.
+    '''
+
+    def __init__(self, loop, ssl=SSL_CONTEXT, timeout=20.0, user_agent='Niantic App',
+                 content_type='application/binary', max_age=None, resolver=DNS_CACHE,
+                 limit=100):
+        self.loop = loop
+        self.limit = limit
+        self.ssl = ssl
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.content_type = content_type
+        self.max_age = max_age
+        self.resolver = resolver
+        self._idle = {}
+        self._semaphores = {}
+        self._heads = {}
+        self._targets = {}
+        self._filling = set()
+
+    def post(self, url, data, headers=None, proxy=None, proxy_auth=None):
+        '''Return an async context manager that posts data to url, a yarl
+        URL or string, and yields the TransportResponse.'''
+        if proxy is not None:
+            raise ValueError('RpcTransport does not support proxies.')
+        if not isinstance(url, URL):
+            url = URL(url)
+        key = self._key(url)
+        return _Exchange(self, key, self._head(key, url.raw_path_qs, len(data), headers), data)
+
+    @staticmethod
+    def _key(url):
+        return server_key(url)
+
+    def _head(self, key, path, length, headers=None):
+        try:
+            prefix = self._heads[key, path]
+        except KeyError:
+            host, port, secure = key
+            if port != (443 if secure else 80):
+                host = '{}:{}'.format(host, port)
+            prefix = self._heads[key, path] = (
+                'POST {} HTTP/1.1\r\n'
+                'Host: {}\r\n'
+                'Content-Type: {}\r\n'
+                'User-Agent: {}\r\n'
+                'Accept-Encoding: identity, gzip\r\n'
+                'Connection: keep-alive\r\n').format(
+                    path, host, self.content_type, self.user_agent).encode('ascii')
+        if headers:
+            prefix += ''.join('{}: {}\r\n'.format(name, value)
+                              for name, value in headers.items()).encode('latin-1')
+        return prefix + b'Content-Length: ' + str(length).encode() + b'\r\n\r\n'
+
+    def _slots(self, key):
+        if not self.limit:
+            return None
+        slots = self._semaphores.get(key)
+        if slots is None:
+            slots = self._semaphores[key] = Semaphore(self.limit)
+        return slots
+
+    async def _acquire(self, key, timeout=None):
+        '''Return an open connection to key and whether it was reused; a
+        new one has to connect within timeout, by default the timeout.'''
+        idle = self._idle.get(key)
+        if idle is None:
+            idle = self._idle[key] = deque()
+        max_age = self.max_age
+        while idle:
+            protocol = idle.pop()
+            if protocol.closed:
+                continue
+            if max_age is not None and monotonic() - protocol.created > max_age:
+                protocol.close()
+                continue
+            target = self._targets.get(key)
+            if target and len(idle) < target and key not in self._filling:
+                self._filling.add(key)
+                ensure_future(self._fill(key), loop=self.loop)
+            return protocol, True
+        if timeout is None:
+            timeout = self.timeout
+        return await wait_for(self._connect(key), timeout), False
+
+    async def _connect(self, key):
+        host, port, secure = key
+        error = None
+        try:
+            addresses = await self.resolver.resolve(host, port, family=AF_INET)
+            for address in addresses:
+                try:
+                    _, protocol = await self.loop.create_connection(
+                        lambda: RpcProtocol(self.loop), address['host'], address['port'],
+                        ssl=self.ssl if secure else None,
+                        server_hostname=host if secure else None)
+                    return protocol
+                except OSError as e:
+                    error = e
+        except OSError as e:
+            error = e
+        raise TransportError(
+            'Cannot connect to {}:{}. {}'.format(host, port, error)) from error
+
+    async def warmup(self, url, n, proxy=None, proxy_auth=None):
+        if proxy is not None:
+            raise ValueError('RpcTransport does not support proxies.')
+        key = self._key(url)
+        self._targets[key] = n
+        self._idle.setdefault(key, deque())
+        self._filling.add(key)
+        opened, error = await self._fill(key)
+        if error is not None and not opened:
+            raise error
+        return opened
+
+    async def _fill(self, key):
+        try:
+            idle = self._idle[key]
+            target = self._targets[key]
+            if self.limit:
+                target = min(target, self.limit)
+            missing = target - len(idle)
+            if missing <= 0:
+                return 0, None
+            results = await gather(
+                *(wait_for(self._connect(key), self.timeout)
+                  for _ in range(missing)),
+                return_exceptions=True)
+        finally:
+            self._filling.discard(key)
+        opened = 0
+        error = None
+        for result in results:
+            if isinstance(result, BaseException):
+                error = result
+            elif key not in self._targets:
+                # the transport was closed while connecting
+                result.close()
+            else:
+                idle.append(result)
+                opened += 1
+        return opened, error
+
+    def status(self):
+        return {'{}://{}:{}'.format('https' if secure else 'http', host, port): {
+                    'idle': sum(not protocol.closed for protocol in idle),
+                    'target': self._targets.get((host, port, secure), 0)}
+                for (host, port, secure), idle in self._idle.items()}
+
+    def close(self):
+        self._targets.clear()
+        for idle in self._idle.values():
+            while idle:
+                idle.pop().close()
+
+
+class _AiohttpExchange:
+    __slots__ = ('transport', 'sessions', 'url', 'data', 'headers', 'proxy', 'proxy_auth')
+
+    def __init__(self, transport, sessions, url, data, headers, proxy, proxy_auth):
+        self.transport = transport
+        self.sessions = sessions
+        self.url = url
+        self.data = data
+        self.headers = headers
+        self.proxy = proxy
+        self.proxy_auth = proxy_auth
+
+    async def __aenter__(self):
+        sessions = self.sessions
+        session = sessions.hold(self.proxy)
+        busy = self.transport._busy
+        key = self.transport._busy_key(self.url, self.proxy)
+        busy[key] = busy.get(key, 0) + 1
+        try:
+            response = await session.post(
+                self.url, data=self.data, headers=self.headers,
+                proxy=self.proxy, proxy_auth=self.proxy_auth)
+            try:
+                # reading the whole body hands the connection back to the pool
+                body = await response.read()
+            except BaseException:
+                response.close()
+                raise
+        except (ClientHttpProxyError, ClientProxyConnectionError, SocksError) as e:
+            raise ProxyException('Proxy connection error.') from e
+        except (TimeoutError, ServerTimeoutError):
+            raise
+        except ServerConnectionError as e:
+            raise DisconnectedError(
+                '{}: {}'.format(e.__class__.__name__, e)) from e
+        except ClientError as e:
+            raise TransportError(
+                '{}: {}'.format(e.__class__.__name__, e)) from e
+        finally:
+            sessions.release(self.proxy)
+            if busy[key] > 1:
+                busy[key] -= 1
+            else:
+                del busy[key]
+        return TransportResponse(response.status, response.headers, body)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+
+class _SingleSession:
+    '''The SessionManager interface over one session for all proxies.'''
+    __slots__ = ('session', 'users')
+
+    def __init__(self, session):
+        self.session = session
+        self.users = 0
+
+    def get(self, proxy=None):
+        return self.session
+
+    def hold(self, proxy=None):
+        self.users += 1
+        return self.session
+
+    def release(self, proxy=None):
+        self.users -= 1
+
+    def in_use(self, proxy=None):
+        return self.users
+
+
+class AiohttpTransport(Transport):
+    '''Posts through an aiohttp 3 ClientSession.
+
+    session is a ClientSession that doesn't raise for status, or a
+    SessionManager such as SESSIONS to get a session per proxy from.
+    Without one, a session is created on first use with up
+    to limit connections, the given default headers and connect timeout,
+    hosts looked up through resolver, TLS through the ssl context and
+    connections closed once they are max_age seconds old. That session
+    resumes TLS sessions across all proxies, use a SessionManager to post
+    through several. loop is only passed on with aiohttp 2, aiohttp 3
+    uses the running one.
+
+    warmup() counts the idle connections to a server with the
+    connections() of the session's connector, which those of SESSIONS
+    and this transport have, less the requests to it in flight; on other
+    connectors it can't tell how many are idle and doesn't top the pool
+    up after requests.
+    '''
+
+    def __init__(self, session=None, limit=100, headers=None, conn_timeout=None,
+                 max_age=None, resolver=DNS_CACHE, ssl=SSL_CONTEXT, loop=None):
+        self.session = session
+        self._sessions = None
+        self.ssl = ssl
+        self.loop = loop
+        self.limit = limit
+        self.headers = headers
+        self.conn_timeout = conn_timeout
+        self.max_age = max_age
+        self.resolver = resolver
+        # (url, proxy) of warmed pools: [target, url, proxy, proxy_auth]
+        self._targets = {}
+        self._filling = set()
+        # requests in flight per (server, proxy)
+        self._busy = {}
+
+    def _manager(self):
+        sessions = self._sessions
+        if sessions is None:
+            session = self.session
+            if session is None:
+                session = self.session = self._create_session()
+            if isinstance(session, SessionManager):
+                sessions = session
+            else:
+                sessions = _SingleSession(session)
+            self._sessions = sessions
+        return sessions
+
+    def _session(self, proxy):
+        return self._manager().get(proxy)
+
+    def post(self, url, data, headers=None, proxy=None, proxy_auth=None):
+        sessions = self._manager()
+        if self._targets:
+            key = (str(url), None if proxy is None else str(proxy))
+            target = self._targets.get(key)
+            if target is not None and key not in self._filling:
+                idle = self._idle(sessions, url, proxy)
+                # the request takes one of the idle connections
+                if idle is not None and idle <= target[0]:
+                    self._filling.add(key)
+                    ensure_future(self._fill(key))
+        return _AiohttpExchange(self, sessions, url, data, headers, proxy, proxy_auth)
+
+    async def warmup(self, url, n, proxy=None, proxy_auth=None):
+        key = (str(url), None if proxy is None else str(proxy))
+        self._targets[key] = [n, url, proxy, proxy_auth]
+        self._filling.add(key)
+        opened, error = await self._fill(key)
+        if error is not None and not opened:
+            raise error
+        return opened
+
+    @staticmethod
+    def _busy_key(url, proxy):
+        return server_key(url), None if proxy is None else str(proxy)
+
+    def _idle(self, sessions, url, proxy):
+        connector = sessions.get(proxy).connector
+        try:
+            connections = connector.connections(server_key(url))
+        except AttributeError:
+            return None
+        return len(connections) - self._busy.get(self._busy_key(url, proxy), 0)
+
+    async def _fill(self, key):
+        held = []
+        try:
+            target, url, proxy, proxy_auth = self._targets[key]
+            sessions = self._manager()
+            session = sessions.hold(proxy)
+            try:
+                connector = session.connector
+                idle = self._idle(sessions, url, proxy)
+                if idle is not None and idle >= target:
+                    return 0, None
+                known = () if idle is None else set(connector.connections())
+                if connector.limit:
+                    target = min(target, connector.limit)
+                # the idle connections come out of the pool first and are
+                # held until every call has taken one or started to open a
+                # new one; new ones go back to the pool once they connect
+                opening = [ensure_future(self._open(session, url, proxy, proxy_auth, known, held))
+                           for _ in range(target)]
+                await sleep(0)
+                self._release(held)
+                results = await gather(*opening, return_exceptions=True)
+            finally:
+                sessions.release(proxy)
+        finally:
+            self._filling.discard(key)
+            self._release(held)
+        errors = [x for x in results if isinstance(x, BaseException)]
+        return results.count(True), errors[0] if errors else None
+
+    @staticmethod
+    def _release(connections):
+        while connections:
+            connections.pop().release()
+
+    async def _open(self, session, url, proxy, proxy_auth, known, held):
+        '''Take a connection from the pool; returns whether it is new.'''
+        socks = proxy is not None and proxy.scheme in ('socks4', 'socks5')
+        request = (ProxyClientRequest if socks else ClientRequest)(
+            'POST', URL(url), proxy=proxy, proxy_auth=proxy_auth,
+            loop=self.loop or get_event_loop())
+        try:
+            connection = await session.connector.connect(request, *self._connect_args(session))
+        except (ClientHttpProxyError, ClientProxyConnectionError, SocksError) as e:
+            raise ProxyException('Proxy connection error.') from e
+        except (TimeoutError, ServerTimeoutError):
+            raise
+        except ClientError as e:
+            raise TransportError(
+                '{}: {}'.format(e.__class__.__name__, e)) from e
+        if connection.protocol in known:
+            held.append(connection)
+            return False
+        connection.release()
+        return True
+
+    @staticmethod
+    def _connect_args(session):
+        if ClientTimeout is None:
+            return ([],)
+        return ([], session.timeout)
+
+    def status(self):
+        return {key: {'idle': self._idle(self._manager(), target[1], target[2]),
+                      'target': target[0]}
+                for key, target in self._targets.items()}
+
+    def _connector(self, **kwargs):
+        if self.max_age is None:
+            return TrackingConnector(limit=self.limit, resolver=self.resolver, **kwargs)
+        return MaxAgeConnector(limit=self.limit, max_age=self.max_age,
+                               resolver=self.resolver, **kwargs)
+
+    def _create_session(self):
+        # aiohttp 3 binds connectors to the running loop
+        if ClientTimeout is None:
+            timeout = {'conn_timeout': self.conn_timeout}
+        else:
+            timeout = {'timeout': ClientTimeout(connect=self.conn_timeout)}
+        return ClientSession(connector=self._connector(ssl=self.ssl),
+                             headers=self.headers, **timeout)
+
+    def close(self):
+        '''Close the session if it was created by or given to this
+        transport; returns a future if closing has to be awaited.'''
+        self._targets.clear()
+        session = self.session
+        if session is None or isinstance(session, SessionManager):
+            return None
+        self.session = self._sessions = None
+        return close_session(session)
+
+
+class Aiohttp2Transport(AiohttpTransport):
+    '''AiohttpTransport for the aiohttp 2 API.'''
+
+    @staticmethod
+    def _connect_args(session):
+        return ()
+
+    def _create_session(self):
+        return ClientSession(connector=self._connector(loop=self.loop, ssl_context=self.ssl),
+                             loop=self.loop,
+                             headers=self.headers,
+                             conn_timeout=self.conn_timeout)
+
+
+# the aiohttp transport matching the installed version
+HttpTransport = Aiohttp2Transport if _aiohttp_version < (3,) else AiohttpTransport
@@ -0,0 +1,404 @@
+from collections import namedtuple
+from struct import Struct, error as StructError
+
+from google.protobuf.message import DecodeError
+
+_double = Struct('<d').unpack_from
+_fixed64 = Struct('<Q').unpack_from
+_float = Struct('<f').unpack_from
+
+WildPokemonRecord = namedtuple('WildPokemonRecord', (
+    'encounter_id', 'spawn_point_id', 'latitude', 'longitude',
+    'pokemon_id', 'time_till_hidden_ms', 'last_modified_timestamp_ms',
+    's2_cell_id'))
+
+FortRecord = namedtuple('FortRecord', (
+    'id', 'type', 'last_modified_timestamp_ms', 'latitude', 'longitude',
+    's2_cell_id'))
+
+
+def read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7f) << shift
+        if b < 0x80:
+            return result, pos
+        shift += 7
+
+
+def signed(value, bits=64):
+    if value >> (bits - 1):
+        return value - (1 << bits)
+    return value
+
+
+def skip_field(buf, pos, wire_type):
+    if wire_type == 0:
+        while buf[pos] & 0x80:
+            pos += 1
+        return pos + 1
+    elif wire_type == 2:
+        length, pos = read_varint(buf, pos)
+        return pos + length
+    elif wire_type == 1:
+        return pos + 8
+    elif wire_type == 5:
+        return pos + 4
+    raise DecodeError('Unsupported wire type {}'.format(wire_type))
+
+
+def merge_fields(raw, fields):
+    """Insert serialized fields into the serialized message raw.
+
+    fields are (field number, encoding) pairs in field number order, each
+    is put before the first field of raw with a higher number, so the
+    result is in the order SerializeToString() would have written.
+    """
+    parts = []
+    start = pos = 0
+    end = len(raw)
+    fields = iter(fields)
+    field = next(fields, None)
+    while field is not None and pos < end:
+        key, value_pos = read_varint(raw, pos)
+        if field[0] < key >> 3:
+            parts.append(raw[start:pos])
+            parts.append(field[1])
+            start = pos
+            field = next(fields, None)
+        else:
+            pos = skip_field(raw, value_pos, key & 7)
+    parts.append(raw[start:])
+    if field is not None:
+        parts.append(field[1])
+        parts.extend(encoding for _, encoding in fields)
+    return b''.join(parts)
+
+
+def read_envelope_status(raw):
+    '''Read status_code and api_url from serialized ResponseEnvelope bytes.
+
+    Every other top-level field, including the returns, is skipped by its
+    length prefix without being copied or decoded.
+    '''
+    buf = raw
+    end = len(buf)
+    pos = 0
+    status_code = 0
+    api_url = ''
+    try:
+        while pos < end:
+            tag = buf[pos]
+            if tag < 0x80:
+                pos += 1
+            else:
+                tag, pos = read_varint(buf, pos)
+            if tag == 0x08:  # 1: status_code
+                status_code, pos = read_varint(buf, pos)
+            elif tag == 0x1a:  # 3: api_url
+                length, pos = read_varint(buf, pos)
+                api_url = bytes(buf[pos:pos + length]).decode('utf-8')
+                pos += length
+            elif tag < 8:
+                raise DecodeError('Invalid field number.')
+            else:
+                pos = skip_field(buf, pos, tag & 7)
+    except (IndexError, UnicodeDecodeError) as e:
+        raise DecodeError('Truncated or malformed message.') from e
+    if pos != end:
+        raise DecodeError('Truncated message.')
+    return signed(status_code), api_url
+
+
+def _wild_pokemon(buf, pos, end, cell_id):
+    encounter_id = last_modified = pokemon_id = time_till_hidden = 0
+    latitude = longitude = 0.0
+    spawn_point_id = ''
+    while pos < end:
+        tag = buf[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = read_varint(buf, pos)
+        if tag == 0x09:  # 1: encounter_id, fixed64
+            encounter_id = _fixed64(buf, pos)[0]
+            pos += 8
+        elif tag == 0x10:  # 2: last_modified_timestamp_ms
+            last_modified, pos = read_varint(buf, pos)
+        elif tag == 0x19:  # 3: latitude
+            latitude = _double(buf, pos)[0]
+            pos += 8
+        elif tag == 0x21:  # 4: longitude
+            longitude = _double(buf, pos)[0]
+            pos += 8
+        elif tag == 0x2a:  # 5: spawn_point_id
+            length, pos = read_varint(buf, pos)
+            spawn_point_id = buf[pos:pos + length].decode('utf-8')
+            pos += length
+        elif tag == 0x3a:  # 7: pokemon_data, only pokemon_id is read
+            length, pos = read_varint(buf, pos)
+            data_end = pos + length
+            while pos < data_end:
+                tag, pos = read_varint(buf, pos)
+                if tag == 0x10:  # 2: pokemon_id
+                    pokemon_id = read_varint(buf, pos)[0]
+                    break
+                pos = skip_field(buf, pos, tag & 7)
+            pos = data_end
+        elif tag == 0x58:  # 11: time_till_hidden_ms
+            time_till_hidden, pos = read_varint(buf, pos)
+        elif tag < 8:
+            raise DecodeError('Invalid field number.')
+        else:
+            pos = skip_field(buf, pos, tag & 7)
+    return WildPokemonRecord(
+        encounter_id, spawn_point_id, latitude, longitude, pokemon_id,
+        signed(time_till_hidden), signed(last_modified), cell_id)
+
+
+def _fort(buf, pos, end, cell_id):
+    last_modified = fort_type = 0
+    latitude = longitude = 0.0
+    fort_id = ''
+    while pos < end:
+        tag = buf[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = read_varint(buf, pos)
+        if tag == 0x0a:  # 1: id
+            length, pos = read_varint(buf, pos)
+            fort_id = buf[pos:pos + length].decode('utf-8')
+            pos += length
+        elif tag == 0x10:  # 2: last_modified_timestamp_ms
+            last_modified, pos = read_varint(buf, pos)
+        elif tag == 0x19:  # 3: latitude
+            latitude = _double(buf, pos)[0]
+            pos += 8
+        elif tag == 0x21:  # 4: longitude
+            longitude = _double(buf, pos)[0]
+            pos += 8
+        elif tag == 0x48:  # 9: type
+            fort_type, pos = read_varint(buf, pos)
+        elif tag < 8:
+            raise DecodeError('Invalid field number.')
+        else:
+            pos = skip_field(buf, pos, tag & 7)
+    return FortRecord(fort_id, signed(fort_type), signed(last_modified),
+                      latitude, longitude, cell_id)
+
+
+def _map_cell(buf, pos, end, pokemon, forts):
+    cell_id = 0
+    # s2_cell_id is the first field in practice, but protobuf allows any
+    # order, so entities are collected per cell and stamped afterwards
+    cell_pokemon = []
+    cell_forts = []
+    while pos < end:
+        tag = buf[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = read_varint(buf, pos)
+        if tag == 0x08:  # 1: s2_cell_id
+            cell_id, pos = read_varint(buf, pos)
+        elif tag == 0x2a:  # 5: wild_pokemons
+            length, pos = read_varint(buf, pos)
+            if pokemon is not None:
+                cell_pokemon.append((pos, pos + length))
+            pos += length
+        elif tag == 0x1a:  # 3: forts
+            length, pos = read_varint(buf, pos)
+            if forts is not None:
+                cell_forts.append((pos, pos + length))
+            pos += length
+        elif tag < 8:
+            raise DecodeError('Invalid field number.')
+        else:
+            pos = skip_field(buf, pos, tag & 7)
+    for start, stop in cell_pokemon:
+        pokemon.append(_wild_pokemon(buf, start, stop, cell_id))
+    for start, stop in cell_forts:
+        forts.append(_fort(buf, start, stop, cell_id))
+
+
+def scan_map_objects(raw, pokemon=True, forts=True):
+    '''Extract wild pokemon and forts from serialized GetMapObjectsResponse
+    bytes without building the message tree.
+
+    Returns a (pokemon, forts) tuple of lists of WildPokemonRecord and
+    FortRecord; a kind that was not requested is returned as None.
+    Fields other than those in the records are skipped undecoded.
+    '''
+    pokemon = [] if pokemon else None
+    forts = [] if forts else None
+    buf = bytes(raw)
+    end = len(buf)
+    pos = 0
+    try:
+        while pos < end:
+            tag = buf[pos]
+            if tag < 0x80:
+                pos += 1
+            else:
+                tag, pos = read_varint(buf, pos)
+            if tag == 0x0a:  # 1: map_cells
+                length, pos = read_varint(buf, pos)
+                cell_end = pos + length
+                if cell_end > end:
+                    raise DecodeError('Truncated message.')
+                _map_cell(buf, pos, cell_end, pokemon, forts)
+                pos = cell_end
+            elif tag < 8:
+                raise DecodeError('Invalid field number.')
+            else:
+                pos = skip_field(buf, pos, tag & 7)
+    except (IndexError, StructError, UnicodeDecodeError) as e:
+        raise DecodeError('Truncated or malformed message.') from e
+    if pos != end:
+        raise DecodeError('Truncated message.')
+    return pokemon, forts
+
+
+_VARINT, _INT64, _FIXED64, _DOUBLE, _FLOAT, _STRING, _BOOL = range(7)
+
+# tag: (column, kind) for the flat entities, columns in the order of the
+# dtypes in aiopogo.columnar
+_MAP_POKEMON = {
+    0x11: (0, _FIXED64),  # 2: encounter_id
+    0x0a: (1, _STRING),   # 1: spawn_point_id
+    0x29: (2, _DOUBLE),   # 5: latitude
+    0x31: (3, _DOUBLE),   # 6: longitude
+    0x18: (4, _VARINT),   # 3: pokemon_id
+    0x20: (5, _INT64)}    # 4: expiration_timestamp_ms
+_NEARBY_POKEMON = {
+    0x19: (0, _FIXED64),  # 3: encounter_id
+    0x08: (1, _VARINT),   # 1: pokemon_id
+    0x15: (2, _FLOAT),    # 2: distance_in_meters
+    0x22: (3, _STRING)}   # 4: fort_id
+_FORT = {
+    0x0a: (0, _STRING),   # 1: id
+    0x48: (1, _VARINT),   # 9: type
+    0x19: (2, _DOUBLE),   # 3: latitude
+    0x21: (3, _DOUBLE),   # 4: longitude
+    0x40: (4, _BOOL),     # 8: enabled
+    0x28: (5, _VARINT),   # 5: owned_by_team
+    0x10: (6, _INT64)}    # 2: last_modified_timestamp_ms
+_SPAWN_POINT = {
+    0x11: (0, _DOUBLE),   # 2: latitude
+    0x19: (1, _DOUBLE)}   # 3: longitude
+
+_DEFAULTS = {_VARINT: 0, _INT64: 0, _FIXED64: 0, _DOUBLE: 0.0, _FLOAT: 0.0,
+             _STRING: '', _BOOL: False}
+
+def _record(buf, pos, end, spec, cell_id):
+    values = [None] * (len(spec) + 1)
+    for column, kind in spec.values():
+        values[column] = _DEFAULTS[kind]
+    values[-1] = cell_id
+    while pos < end:
+        tag = buf[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = read_varint(buf, pos)
+        try:
+            column, kind = spec[tag]
+        except KeyError:
+            if tag < 8:
+                raise DecodeError('Invalid field number.')
+            pos = skip_field(buf, pos, tag & 7)
+            continue
+        if kind == _DOUBLE:
+            values[column] = _double(buf, pos)[0]
+            pos += 8
+        elif kind == _STRING:
+            length, pos = read_varint(buf, pos)
+            values[column] = buf[pos:pos + length].decode('utf-8')
+            pos += length
+        elif kind == _FIXED64:
+            values[column] = _fixed64(buf, pos)[0]
+            pos += 8
+        elif kind == _FLOAT:
+            values[column] = _float(buf, pos)[0]
+            pos += 4
+        else:
+            value, pos = read_varint(buf, pos)
+            if kind == _BOOL:
+                value = bool(value)
+            elif value >> 63:
+                value -= 1 << 64
+            values[column] = value
+    return tuple(values)
+
+
+def _map_cell_all(buf, pos, end, kinds):
+    cell_id = 0
+    spans = []
+    while pos < end:
+        tag = buf[pos]
+        if tag < 0x80:
+            pos += 1
+        else:
+            tag, pos = read_varint(buf, pos)
+        if tag == 0x08:  # 1: s2_cell_id
+            cell_id, pos = read_varint(buf, pos)
+        elif tag in (0x1a, 0x22, 0x2a, 0x52, 0x5a):
+            # forts, spawn_points, wild, catchable and nearby pokemon
+            length, pos = read_varint(buf, pos)
+            spans.append((tag, pos, pos + length))
+            pos += length
+        elif tag < 8:
+            raise DecodeError('Invalid field number.')
+        else:
+            pos = skip_field(buf, pos, tag & 7)
+    for tag, start, stop in spans:
+        if tag == 0x2a:
+            kinds['wild_pokemon'].append(_wild_pokemon(buf, start, stop, cell_id))
+        elif tag == 0x1a:
+            kinds['forts'].append(_record(buf, start, stop, _FORT, cell_id))
+        elif tag == 0x22:
+            kinds['spawn_points'].append(_record(buf, start, stop, _SPAWN_POINT, cell_id))
+        elif tag == 0x52:
+            kinds['map_pokemon'].append(_record(buf, start, stop, _MAP_POKEMON, cell_id))
+        else:
+            kinds['nearby_pokemon'].append(_record(buf, start, stop, _NEARBY_POKEMON, cell_id))
+
+
+def scan_map_cells(raw):
+    '''Extract every wild, catchable and nearby pokemon, fort and spawn
+    point from serialized GetMapObjectsResponse bytes.
+
+    Returns a dict of lists of plain tuples keyed like the result of
+    aiopogo.columnar.map_objects_to_arrays, with the same column order.
+    '''
+    kinds = {'wild_pokemon': [], 'map_pokemon': [], 'nearby_pokemon': [],
+             'forts': [], 'spawn_points': []}
+    buf = bytes(raw)
+    end = len(buf)
+    pos = 0
+    try:
+        while pos < end:
+            tag = buf[pos]
+            if tag < 0x80:
+                pos += 1
+            else:
+                tag, pos = read_varint(buf, pos)
+            if tag == 0x0a:  # 1: map_cells
+                length, pos = read_varint(buf, pos)
+                cell_end = pos + length
+                if cell_end > end:
+                    raise DecodeError('Truncated message.')
+                _map_cell_all(buf, pos, cell_end, kinds)
+                pos = cell_end
+            elif tag < 8:
+                raise DecodeError('Invalid field number.')
+            else:
+                pos = skip_field(buf, pos, tag & 7)
+    except (IndexError, StructError, UnicodeDecodeError) as e:
+        raise DecodeError('Truncated or malformed message.') from e
+    if pos != end:
+        raise DecodeError('Truncated message.')
+    return kinds
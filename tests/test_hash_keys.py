@@ -0,0 +1,172 @@
+from asyncio import IncompleteReadError, gather, new_event_loop, set_event_loop, sleep, start_server
+from json import dumps
+from time import time
+from unittest import TestCase, main
+
+from aiopogo.exceptions import HashingQuotaExceededException
+from aiopogo.hash_keys import KeyScheduler
+from aiopogo.hash_server import HashServer
+from aiopogo.resolver import DnsCache
+from aiopogo.transport import RpcTransport
+
+RESPONSE = dumps({'locationHash': 1, 'locationAuthHash': 2,
+                  'requestHashes': [3]}).encode('ascii')
+
+
+class MockHashServer:
+    '''Answers hash requests like the Bossland server, with a quota per
+    key reported in the rate headers and 429 once it is used up.'''
+
+    def __init__(self, quotas, period=60):
+        self.maximum = dict(quotas)
+        self.remaining = dict(quotas)
+        self.period_end = int(time()) + period
+        self.served = {token: 0 for token in quotas}
+        self.rejected = 0
+        self.connections = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                headers = {}
+                for line in head.decode('latin-1').split('\r\n')[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                await reader.readexactly(int(headers['content-length']))
+                writer.write(self.respond(headers.get('x-authtoken')))
+        except (IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self.connections -= 1
+
+    def respond(self, token):
+        if token not in self.remaining:
+            return b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n'
+        if self.remaining[token] <= 0:
+            self.rejected += 1
+            return b'HTTP/1.1 429 Too Many Requests\r\nContent-Length: 0\r\n\r\n'
+        self.remaining[token] -= 1
+        self.served[token] += 1
+        return (b'HTTP/1.1 200 OK\r\n'
+                b'Content-Type: application/json\r\n'
+                b'X-RateRequestsRemaining: %d\r\n'
+                b'X-RatePeriodEnd: %d\r\n'
+                b'X-MaxRequestCount: %d\r\n'
+                b'X-AuthTokenExpiration: %d\r\n'
+                b'Content-Length: %d\r\n\r\n' % (
+                    self.remaining[token], self.period_end,
+                    self.maximum[token], self.period_end + 86400,
+                    len(RESPONSE)) + RESPONSE)
+
+
+class KeySchedulerTest(TestCase):
+    def test_most_headroom_first(self):
+        keys = KeyScheduler(['a', 'b'], pace=False)
+        period_end = int(time()) + 60
+        for token, remaining in (('a', 10), ('b', 50)):
+            key = keys.keys[token]
+            key.in_flight += 1
+            keys.release(key, {'X-RateRequestsRemaining': str(remaining),
+                               'X-RatePeriodEnd': str(period_end),
+                               'X-MaxRequestCount': '100',
+                               'X-AuthTokenExpiration': str(period_end)})
+        loop = new_event_loop()
+        try:
+            key = loop.run_until_complete(keys.acquire())
+        finally:
+            loop.close()
+        self.assertEqual(key.token, 'b')
+        self.assertEqual(key.in_flight, 1)
+
+    def test_out_of_order_responses(self):
+        keys = KeyScheduler(['a'])
+        key = keys.keys['a']
+        period_end = int(time()) + 60
+        for remaining in (5, 7):
+            key.in_flight += 1
+            keys.release(key, {'X-RateRequestsRemaining': str(remaining),
+                               'X-RatePeriodEnd': str(period_end),
+                               'X-MaxRequestCount': '10',
+                               'X-AuthTokenExpiration': str(period_end)})
+        self.assertEqual(key.remaining, 5)
+        self.assertEqual(key.in_flight, 0)
+
+    def test_period_end_refills(self):
+        keys = KeyScheduler(['a'])
+        key = keys.keys['a']
+        key.remaining, key.maximum, key.period_end = 0, 10, time() - 1
+        self.assertEqual(key.headroom(time()), 10)
+        self.assertIsNone(key.period_end)
+
+
+class MockServerTest(TestCase):
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        set_event_loop(None)
+
+    def run_requests(self, server, keys, n):
+        async def run():
+            listener = await start_server(server.handle, '127.0.0.1', 0)
+            port = listener.sockets[0].getsockname()[1]
+            # the shared DNS_CACHE keeps a resolver of the first loop
+            transport = RpcTransport(self.loop, timeout=5.0, resolver=DnsCache())
+            hashing = HashServer('http://127.0.0.1:{}/api/v159_1/hash'.format(port),
+                                 keys, transport)
+            try:
+                return await gather(
+                    *(hashing._request(b'{}') for _ in range(n)),
+                    return_exceptions=True)
+            finally:
+                transport.close()
+                await transport.resolver.close()
+                while server.connections:
+                    await sleep(0.01)
+                listener.close()
+                await listener.wait_closed()
+        return self.loop.run_until_complete(run())
+
+    def test_quota_from_headers(self):
+        server = MockHashServer({'a': 30, 'b': 10})
+        keys = KeyScheduler(['a', 'b'], reserve=0, pace=False)
+        # the first responses teach the scheduler the quotas
+        self.run_requests(server, keys, 2)
+        results = self.run_requests(server, keys, 30)
+
+        self.assertFalse([r for r in results if isinstance(r, Exception)])
+        self.assertEqual(server.rejected, 0)
+        self.assertEqual(sum(server.served.values()), 32)
+        for token, key in keys.keys.items():
+            self.assertEqual(key.remaining, server.remaining[token])
+            self.assertEqual(key.maximum, server.maximum[token])
+            self.assertEqual(key.period_end, server.period_end)
+            self.assertEqual(key.in_flight, 0)
+        # the larger quota took the larger share
+        self.assertGreater(server.served['a'], server.served['b'])
+
+    def test_reserve_kept(self):
+        server = MockHashServer({'a': 8})
+        keys = KeyScheduler(['a'], reserve=3, pace=False)
+        self.run_requests(server, keys, 1)
+        results = self.run_requests(server, keys, 4)
+        self.assertFalse([r for r in results if isinstance(r, Exception)])
+        self.assertEqual(keys.keys['a'].remaining, 3)
+
+    def test_rejected_without_headers(self):
+        server = MockHashServer({'a': 1})
+        keys = KeyScheduler(['a'], reserve=0, pace=False)
+        results = self.run_requests(server, keys, 2)
+        errors = [r for r in results if isinstance(r, Exception)]
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], HashingQuotaExceededException)
+        self.assertEqual(keys.keys['a'].remaining, 0)
+
+
+if __name__ == '__main__':
+    main()
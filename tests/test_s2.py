@@ -0,0 +1,61 @@
+from math import cos, degrees, radians, sin
+from unittest import TestCase, main
+
+from aiopogo import s2
+
+# ids from the S2 reference implementation, points on all six faces
+KNOWN_IDS = {
+    (40.7831, -73.9712): {10: 9926594385212866560, 15: 9926593950347427840, 30: 9926593949990555489},
+    (51.5074, -0.1278): {10: 5221366315540807680, 15: 5221366101866184704, 30: 5221366101706051497},
+    (-33.8688, 151.2093): {10: 7715421526173941760, 15: 7715420700466479104, 30: 7715420701375135829},
+    (35.6762, 139.6503): {10: 6924551608407687168, 15: 6924550875042021376, 30: 6924550875399867263},
+    (0.0, 0.0): {10: 1152922604118474752, 15: 1152921505680588800, 30: 1152921504606846977},
+    (89.9, 45.0): {10: 4995992820125794304, 15: 4995991725982875648, 30: 4995991726067041349},
+    (-89.9, -120.0): {10: 11913519648743620608, 15: 11913520272587620352, 30: 11913520271708674719},
+    (-22.9068, -43.1729): {10: 43207508436713472, 15: 43208471583129600, 30: 43208472254904315},
+    (64.1466, -21.9426): {10: 5248394510374797312, 15: 5248394706869551104, 30: 5248394706232407165},
+    (1.3521, 103.8198): {10: 3592202344479064064, 15: 3592202124361990144, 30: 3592202124967996855},
+}
+
+
+class CellIdTest(TestCase):
+    def test_known_ids(self):
+        for (latitude, longitude), ids in KNOWN_IDS.items():
+            for level, expected in ids.items():
+                with self.subTest(latitude=latitude, longitude=longitude, level=level):
+                    self.assertEqual(s2.cell_id(latitude, longitude, level), expected)
+
+    def test_cell_ids(self):
+        latitudes, longitudes = zip(*KNOWN_IDS)
+        for level in (10, 15, 30):
+            with self.subTest(level=level):
+                self.assertEqual(list(s2.cell_ids(latitudes, longitudes, level)),
+                                 [KNOWN_IDS[point][level] for point in KNOWN_IDS])
+
+
+class CoveringTest(TestCase):
+    def test_contains_disc(self):
+        latitude, longitude = 40.7831, -73.9712
+        ids = s2.get_cell_ids(latitude, longitude, radius=500)
+        self.assertEqual(list(ids), sorted(set(ids)))
+        self.assertIn(s2.cell_id(latitude, longitude), ids)
+        # every point well inside the disc is in one of the cells
+        for bearing in range(0, 360, 15):
+            for distance in (100.0, 250.0, 450.0):
+                north = distance * cos(radians(bearing)) / s2.EARTH_RADIUS
+                east = distance * sin(radians(bearing)) / s2.EARTH_RADIUS
+                point = (latitude + degrees(north),
+                         longitude + degrees(east) / cos(radians(latitude)))
+                with self.subTest(bearing=bearing, distance=distance):
+                    self.assertIn(s2.cell_id(*point), ids)
+
+    def test_union(self):
+        points = [(40.7831, -73.9712), (40.79, -73.96), (51.5074, -0.1278)]
+        expected = set()
+        for latitude, longitude in points:
+            expected.update(s2.get_cell_ids(latitude, longitude, radius=300))
+        self.assertEqual(list(s2.covering_cell_ids(points, radius=300)), sorted(expected))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,226 @@
+from asyncio import IncompleteReadError, TimeoutError, gather, new_event_loop, set_event_loop, sleep, start_server
+from gzip import compress
+from time import monotonic
+from unittest import TestCase, main
+
+from aiopogo.exceptions import BadRPCException, MalformedNianticResponseException
+from aiopogo.resolver import DnsCache
+from aiopogo.transport import RpcTransport
+
+
+class MockServer:
+    '''Answers every POST with body, optionally chunked or gzipped and
+    after delay seconds, and counts connections and requests.'''
+
+    def __init__(self, body=b'x' * 30000, chunked=False, gzip=False, delay=0.0, close=False):
+        self.body = body
+        self.chunked = chunked
+        self.gzip = gzip
+        self.delay = delay
+        self.close = close
+        self.connections = 0
+        self.open = 0
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.open += 1
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                lines = head.decode('latin-1').split('\r\n')
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                data = await reader.readexactly(int(headers['content-length']))
+                self.requests.append((lines[0], headers, data))
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+                try:
+                    if self.delay:
+                        await sleep(self.delay)
+                    writer.write(self.response())
+                finally:
+                    self.in_flight -= 1
+                if self.close:
+                    break
+        except (IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+            self.open -= 1
+
+    def response(self):
+        body = compress(self.body) if self.gzip else self.body
+        head = b'HTTP/1.1 200 OK\r\nContent-Type: application/x-protobuf\r\n'
+        if self.gzip:
+            head += b'Content-Encoding: gzip\r\n'
+        if self.close:
+            head += b'Connection: close\r\n'
+        if not self.chunked:
+            return head + b'Content-Length: %d\r\n\r\n' % len(body) + body
+        chunks = [body[i:i + 4096] for i in range(0, len(body), 4096)]
+        return head + b'Transfer-Encoding: chunked\r\n\r\n' + b''.join(
+            b'%x\r\n' % len(chunk) + chunk + b'\r\n' for chunk in chunks) + b'0\r\n\r\n'
+
+
+class RpcTransportTest(TestCase):
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        set_event_loop(None)
+
+    def run_with(self, server, test, **kwargs):
+        '''Run test(transport, url) against server.'''
+        async def run():
+            listener = await start_server(server.handle, '127.0.0.1', 0)
+            url = 'http://127.0.0.1:{}/plfe/rpc'.format(listener.sockets[0].getsockname()[1])
+            # the shared DNS_CACHE keeps a resolver of the first loop
+            transport = RpcTransport(self.loop, resolver=DnsCache(), **kwargs)
+            try:
+                return await test(transport, url)
+            finally:
+                transport.close()
+                await transport.resolver.close()
+                while server.open:
+                    await sleep(0.01)
+                listener.close()
+                await listener.wait_closed()
+        return self.loop.run_until_complete(run())
+
+    def test_body_and_reuse(self):
+        server = MockServer()
+
+        async def test(transport, url):
+            for n in range(5):
+                async with transport.post(url, b'request %d' % n, {'X-Test': 'yes'}) as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertEqual(response.headers['content-type'], 'application/x-protobuf')
+                    self.assertEqual(bytes(response.body), server.body)
+        self.run_with(server, test)
+
+        self.assertEqual(server.connections, 1)
+        self.assertEqual([data for _, _, data in server.requests],
+                         [b'request %d' % n for n in range(5)])
+        line, headers, _ = server.requests[0]
+        self.assertEqual(line, 'POST /plfe/rpc HTTP/1.1')
+        self.assertEqual(headers['x-test'], 'yes')
+        self.assertEqual(headers['user-agent'], 'Niantic App')
+
+    def test_chunked_gzip(self):
+        for chunked, gzip in ((True, False), (False, True), (True, True)):
+            server = MockServer(body=bytes(range(256)) * 300, chunked=chunked, gzip=gzip)
+
+            async def test(transport, url):
+                for _ in range(2):
+                    async with transport.post(url, b'x') as response:
+                        self.assertEqual(bytes(response.body), server.body)
+            with self.subTest(chunked=chunked, gzip=gzip):
+                self.run_with(server, test)
+                self.assertEqual(server.connections, 1)
+
+    def test_connection_close(self):
+        server = MockServer(close=True)
+
+        async def test(transport, url):
+            for _ in range(3):
+                async with transport.post(url, b'x') as response:
+                    self.assertEqual(bytes(response.body), server.body)
+        self.run_with(server, test)
+        self.assertEqual(server.connections, 3)
+
+    def test_kept_after_response_error(self):
+        server = MockServer()
+
+        async def test(transport, url):
+            # an error about a complete response leaves the connection usable
+            with self.assertRaises(BadRPCException):
+                async with transport.post(url, b'x'):
+                    raise BadRPCException('Bad RPC.')
+            async with transport.post(url, b'x'):
+                pass
+            self.assertEqual(server.connections, 1)
+            # a malformed one doesn't
+            with self.assertRaises(MalformedNianticResponseException):
+                async with transport.post(url, b'x'):
+                    raise MalformedNianticResponseException('Bad envelope.')
+            async with transport.post(url, b'x'):
+                pass
+        self.run_with(server, test)
+        self.assertEqual(server.connections, 2)
+
+    def test_limit(self):
+        server = MockServer(delay=0.05)
+
+        async def test(transport, url):
+            async def post():
+                async with transport.post(url, b'x') as response:
+                    return bytes(response.body)
+            return await gather(*(post() for _ in range(8)))
+        bodies = self.run_with(server, test, limit=2)
+        self.assertEqual(bodies, [server.body] * 8)
+        self.assertEqual(server.max_in_flight, 2)
+        self.assertEqual(server.connections, 2)
+
+    def test_one_deadline(self):
+        # with one slot, the second request waits 0.3s for it and only has
+        # the rest of the timeout left for its own response
+        server = MockServer(delay=0.3)
+
+        async def test(transport, url):
+            async def post():
+                start = monotonic()
+                try:
+                    async with transport.post(url, b'x'):
+                        return 'ok', monotonic() - start
+                except TimeoutError:
+                    return 'timeout', monotonic() - start
+            return await gather(post(), post())
+        (first, _), (second, elapsed) = self.run_with(server, test, limit=1, timeout=0.5)
+        self.assertEqual(first, 'ok')
+        self.assertEqual(second, 'timeout')
+        self.assertLess(elapsed, 0.58)
+
+    def test_warmup(self):
+        server = MockServer()
+
+        async def test(transport, url):
+            self.assertEqual(await transport.warmup(url, 3), 3)
+            self.assertEqual(list(transport.status().values()), [{'idle': 3, 'target': 3}])
+            async with transport.post(url, b'x'):
+                pass
+            # taking an idle connection tops the pool up in the background,
+            # and the used one comes back afterwards
+            for _ in range(100):
+                if server.connections == 4:
+                    break
+                await sleep(0.01)
+            self.assertEqual(list(transport.status().values()), [{'idle': 4, 'target': 3}])
+        self.run_with(server, test)
+        self.assertEqual(server.connections, 4)
+
+    def test_close_while_filling(self):
+        server = MockServer()
+
+        async def test(transport, url):
+            await transport.warmup(url, 2)
+            async with transport.post(url, b'x'):
+                pass
+            # the top-up started by the request finishes after close()
+            transport.close()
+            for _ in range(100):
+                if not server.open:
+                    break
+                await sleep(0.01)
+            self.assertEqual(server.open, 0)
+        self.run_with(server, test)
+
+
+if __name__ == '__main__':
+    main()
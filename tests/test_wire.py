@@ -0,0 +1,141 @@
+from random import Random
+from unittest import TestCase, main
+
+from google.protobuf.message import DecodeError
+
+from aiopogo.wire import read_envelope_status, scan_map_objects
+from aiopogo.pogoprotos.networking.envelopes.response_envelope_pb2 import ResponseEnvelope
+from aiopogo.pogoprotos.networking.responses.get_map_objects_response_pb2 import GetMapObjectsResponse
+
+
+def map_objects(seed, cells=10):
+    '''A GetMapObjectsResponse with random pokemon and forts, and fields
+    the scanner has to skip in every message it reads.'''
+    rnd = Random(seed)
+    response = GetMapObjectsResponse()
+    response.status = 1
+    for n in range(cells):
+        cell = response.map_cells.add()
+        cell.s2_cell_id = rnd.getrandbits(64)
+        cell.current_timestamp_ms = 1500000000000 + n
+        for i in range(rnd.randint(0, 12)):
+            pokemon = cell.wild_pokemons.add()
+            pokemon.encounter_id = rnd.getrandbits(64)
+            pokemon.last_modified_timestamp_ms = 1500000000000 + i
+            pokemon.latitude = rnd.uniform(-90, 90)
+            pokemon.longitude = rnd.uniform(-180, 180)
+            pokemon.spawn_point_id = '{:x}'.format(rnd.getrandbits(40))
+            pokemon.pokemon_data.cp = rnd.randint(10, 3000)
+            pokemon.pokemon_data.pokemon_id = rnd.randint(1, 386)
+            pokemon.pokemon_data.height_m = 1.25
+            # -1 for spawns of unknown duration
+            pokemon.time_till_hidden_ms = rnd.choice((-1, rnd.randint(0, 3600000)))
+        for i in range(rnd.randint(0, 8)):
+            fort = cell.forts.add()
+            fort.id = '{:032x}.16'.format(rnd.getrandbits(128))
+            fort.last_modified_timestamp_ms = 1500000000000 + i
+            fort.latitude = rnd.uniform(-90, 90)
+            fort.longitude = rnd.uniform(-180, 180)
+            fort.enabled = True
+            fort.type = rnd.choice((0, 1))
+            fort.image_url = 'https://example.com/' + 'a' * 40
+        for _ in range(rnd.randint(0, 4)):
+            spawn_point = cell.spawn_points.add()
+            spawn_point.latitude = rnd.uniform(-90, 90)
+            spawn_point.longitude = rnd.uniform(-180, 180)
+    return response
+
+
+def varint(value):
+    encoded = bytearray()
+    while value > 0x7f:
+        encoded.append(value & 0x7f | 0x80)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+class ScanMapObjectsTest(TestCase):
+    def assert_scans_like_parser(self, response):
+        pokemon, forts = scan_map_objects(response.SerializeToString())
+
+        parsed = GetMapObjectsResponse()
+        parsed.ParseFromString(response.SerializeToString())
+        expected_pokemon = []
+        expected_forts = []
+        for cell in parsed.map_cells:
+            for p in cell.wild_pokemons:
+                expected_pokemon.append((
+                    p.encounter_id, p.spawn_point_id, p.latitude, p.longitude,
+                    p.pokemon_data.pokemon_id, p.time_till_hidden_ms,
+                    p.last_modified_timestamp_ms, cell.s2_cell_id))
+            for f in cell.forts:
+                expected_forts.append((
+                    f.id, f.type, f.last_modified_timestamp_ms, f.latitude,
+                    f.longitude, cell.s2_cell_id))
+        self.assertEqual([tuple(p) for p in pokemon], expected_pokemon)
+        self.assertEqual([tuple(f) for f in forts], expected_forts)
+
+    def test_matches_parser(self):
+        for seed in range(20):
+            with self.subTest(seed=seed):
+                self.assert_scans_like_parser(map_objects(seed))
+
+    def test_empty(self):
+        self.assertEqual(scan_map_objects(b''), ([], []))
+        self.assert_scans_like_parser(GetMapObjectsResponse())
+
+    def test_cell_id_after_entities(self):
+        # protobuf allows fields in any order, the cell id may come last
+        cell = map_objects(1, cells=1).map_cells[0]
+        cell_id = cell.s2_cell_id
+        cell.s2_cell_id = 0
+        cell.wild_pokemons.add().encounter_id = 5
+        payload = cell.SerializeToString() + b'\x08' + varint(cell_id)
+        pokemon, forts = scan_map_objects(b'\x0a' + varint(len(payload)) + payload)
+        self.assertTrue(pokemon)
+        self.assertTrue(all(p.s2_cell_id == cell_id for p in pokemon))
+        self.assertTrue(all(f.s2_cell_id == cell_id for f in forts))
+
+    def test_kinds_skipped(self):
+        raw = map_objects(2).SerializeToString()
+        pokemon, forts = scan_map_objects(raw, forts=False)
+        self.assertIsNone(forts)
+        self.assertEqual(pokemon, scan_map_objects(raw)[0])
+        pokemon, forts = scan_map_objects(raw, pokemon=False)
+        self.assertIsNone(pokemon)
+
+    def test_truncated(self):
+        raw = map_objects(3).SerializeToString()
+        for end in (1, len(raw) // 2, len(raw) - 1):
+            with self.subTest(end=end):
+                with self.assertRaises(DecodeError):
+                    scan_map_objects(raw[:end])
+
+
+class ReadEnvelopeStatusTest(TestCase):
+    def test_matches_parser(self):
+        envelope = ResponseEnvelope()
+        envelope.status_code = 53
+        envelope.request_id = 1234567
+        envelope.api_url = 'pgorelease.nianticlabs.com/plfe/123'
+        envelope.returns.append(map_objects(4).SerializeToString())
+        envelope.returns.append(b'')
+        self.assertEqual(read_envelope_status(envelope.SerializeToString()),
+                         (53, 'pgorelease.nianticlabs.com/plfe/123'))
+
+    def test_negative_status(self):
+        envelope = ResponseEnvelope()
+        envelope.status_code = -1
+        self.assertEqual(read_envelope_status(envelope.SerializeToString()), (-1, ''))
+
+    def test_truncated(self):
+        envelope = ResponseEnvelope()
+        envelope.status_code = 1
+        envelope.returns.append(b'x' * 100)
+        with self.assertRaises(DecodeError):
+            read_envelope_status(envelope.SerializeToString()[:-10])
+
+
+if __name__ == '__main__':
+    main()